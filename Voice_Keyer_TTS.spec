@@ -5,7 +5,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=['pyttsx3.drivers', 'pyttsx3.drivers.sapi5', 'sounddevice', 'soundfile', 'numpy'],
+    hiddenimports=['pyttsx3.drivers', 'pyttsx3.drivers.sapi5', 'sounddevice', 'soundfile', 'numpy', 'serial'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
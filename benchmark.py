@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+"""
+Headless benchmarks for Voice_Keyer_TTS.
+
+Usage:
+    python benchmark.py                    (run all, compare with the baseline)
+    python benchmark.py startup latency    (run only some benchmarks)
+    python benchmark.py --update-baseline  (store the results as the new baseline)
+
+Each benchmark runs in its own process with a temporary home directory and
+stand-in pyttsx3 and sounddevice modules, so no speech engine, sound card
+or display is needed. numpy and soundfile must be installed. Start-up is
+measured cold in several processes and the median is reported.
+
+A metric fails if it is worse than its baseline by more than TOLERANCE
+(and by more than its unit's minimum slack, which keeps fast metrics from
+failing on timer noise). The exit status is 1 if any metric fails.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(SCRIPT_DIR, 'benchmark_baseline.json')
+
+# A metric regresses when value > baseline * (1 + TOLERANCE) + SLACK[unit]
+TOLERANCE = 0.5
+SLACK = {'ms': 5.0, 'mb': 2.0, 'us': 5.0}
+
+SAMPLERATE = 48000       # rate reported by the stand-in sound card
+FAKE_TTS_RATE = 22050    # rate of the stand-in engine's renders
+SECONDS_PER_CHAR = 0.06  # length of a stand-in render per character of text
+PLAYS = 30               # key presses timed per latency benchmark
+STARTUP_RUNS = 5         # cold start-ups (one process each) whose median is reported
+MEMORY_SLOTS = 50        # slots of each mode loaded for the memory benchmark
+LONG_TAKE_SECONDS = 300  # length of the take in the record-stop benchmark
+INPUT_SECONDS = 60       # input fed through the pre-roll monitor per input benchmark run
+DVR_MINUTES = 5          # receive recorder length in the input benchmark
+
+EXAMPLE_TEXT = "CQ CQ contest this is W1AW W1AW contest"
+
+
+# ---------------------------------------------------------------------------
+# Stand-in backends (installed in the benchmark processes only)
+# ---------------------------------------------------------------------------
+
+class _FakeVoice:
+    def __init__(self, voice_id, name):
+        self.id = voice_id
+        self.name = name
+
+
+class _FakeEngine:
+    """pyttsx3 engine that renders a tone as long as the text would take to say."""
+
+    def __init__(self):
+        self._properties = {'rate': 150, 'volume': 1.0, 'voice': None}
+        self._pending = []
+
+    def connect(self, name, callback):
+        pass
+
+    def getProperty(self, name):
+        if name == 'voices':
+            return [_FakeVoice('david', 'David'), _FakeVoice('zira', 'Zira')]
+        return self._properties.get(name)
+
+    def setProperty(self, name, value):
+        self._properties[name] = value
+
+    def say(self, text):
+        self._pending.append((text, None))
+
+    def save_to_file(self, text, path):
+        self._pending.append((text, path))
+
+    def runAndWait(self):
+        import numpy as np
+        import soundfile as sf
+        for text, path in self._pending:
+            if path is not None:
+                t = np.arange(int(len(text) * SECONDS_PER_CHAR * FAKE_TTS_RATE)) / FAKE_TTS_RATE
+                sf.write(path, (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32), FAKE_TTS_RATE)
+        self._pending = []
+
+    def stop(self):
+        self._pending = []
+
+
+class _FakeInputStream:
+    """sounddevice.InputStream that never calls back; benchmarks feed the callback."""
+
+    def __init__(self, callback=None, **kwargs):
+        self.callback = callback
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def install_fake_backends():
+    """Put stand-in pyttsx3 and sounddevice modules in sys.modules."""
+    pyttsx3 = types.ModuleType('pyttsx3')
+    pyttsx3.init = lambda *args, **kwargs: _FakeEngine()
+    sys.modules['pyttsx3'] = pyttsx3
+
+    def output_stream(**kwargs):
+        # The keyer's own timer-driven stream, with a sound card's output latency
+        import voice_keyer_tts
+        return voice_keyer_tts.FakeOutputStream(latency=0.01, **kwargs)
+
+    def check_input_settings(samplerate=None, **kwargs):
+        if samplerate != SAMPLERATE:
+            raise ValueError(f"Invalid sample rate: {samplerate}")
+
+    sounddevice = types.ModuleType('sounddevice')
+    sounddevice.OutputStream = output_stream
+    sounddevice.InputStream = _FakeInputStream
+    sounddevice.query_devices = lambda device=None, kind=None: {
+        'name': 'benchmark', 'default_samplerate': float(SAMPLERATE)}
+    sounddevice.check_input_settings = check_input_settings
+    sys.modules['sounddevice'] = sounddevice
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks (each runs in a child process and returns {metric: value})
+# ---------------------------------------------------------------------------
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def _take(seconds, rate=SAMPLERATE):
+    import numpy as np
+    t = np.arange(int(seconds * rate)) / rate
+    data = (0.4 * np.sin(2 * np.pi * 300 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t)))
+    return data.astype(np.float32)
+
+
+def _start_core(vk):
+    """Create a KeyerCore with audio, as the daemon does, and wait for the voice search."""
+    core = vk.KeyerCore()
+    vk.load_audio_libraries()
+    core._start_audio()
+    core.tts.configure().future.result()  # engine started and voice search done
+    return core
+
+
+def _wait_renders(core):
+    """Block until every render queued so far has finished."""
+    core._submit_render([], core._tts_settings()).result()
+
+
+def bench_startup():
+    """Import, core construction and audio start-up, as in a daemon launch."""
+    start = time.perf_counter()
+    import voice_keyer_tts as vk
+    imported = time.perf_counter()
+    core = vk.KeyerCore()
+    created = time.perf_counter()
+    vk.load_audio_libraries()
+    core._start_audio()
+    audio = time.perf_counter()
+    core.tts.configure().future.result()
+    engine = time.perf_counter()
+    core.close()
+    return {
+        'startup_import_ms': _ms(imported - start),
+        'startup_core_ms': _ms(created - imported),
+        'startup_audio_ms': _ms(audio - created),
+        'startup_engine_ms': _ms(engine - audio),
+    }
+
+
+def _time_plays(vk, core, key):
+    """Press key PLAYS times; return the median key-to-first-sample and dispatch times."""
+    vk.LATENCY.reset()
+    for _ in range(PLAYS):
+        core.play_message(key)
+        time.sleep(0.03)
+    core.stop_speech()
+    time.sleep(0.05)
+    summary = vk.LATENCY.summary()
+    return summary['key to audio']['p50_ms'], summary['play dispatch']['p50_ms']
+
+
+def bench_latency():
+    """Key press to first sample at the (stand-in) DAC for TTS, recording and clip slots."""
+    import voice_keyer_tts as vk
+    vk.LATENCY.enabled = True
+    core = _start_core(vk)
+    core.message_slots['F1'] = EXAMPLE_TEXT
+    core.slot_modes['F2'] = 'rec'
+    core.bank.archive.put('F2', _take(3.0), SAMPLERATE)
+    core._prerender_all()
+    _wait_renders(core)
+    core.recording_bank.load_all(core.bank.archive)
+    for word in vk.CLIP_WORDS:
+        core.clip_bank.archive.put(word, _take(0.4), SAMPLERATE)
+    core.clip_bank.load()
+    core.message_slots['F4'] = 'DL1ABC 59 0123'
+    core.slot_modes['F4'] = 'clips'
+
+    tts_audio, tts_dispatch = _time_plays(vk, core, 'F1')
+    rec_audio, rec_dispatch = _time_plays(vk, core, 'F2')
+    clips_audio, _ = _time_plays(vk, core, 'F4')
+    clips_assembly = vk.LATENCY.summary()['clip assembly']['p50_ms']
+
+    # First play of a text that is not cached yet: render, then play
+    uncached = []
+    for i in range(5):
+        core.message_slots['F3'] = f"{EXAMPLE_TEXT} {i}"
+        vk.LATENCY.reset()
+        core.play_message('F3')
+        deadline = time.perf_counter() + 5.0
+        while 'key to audio' not in vk.LATENCY.summary() and time.perf_counter() < deadline:
+            time.sleep(0.005)
+        uncached.append(vk.LATENCY.summary()['key to audio']['p50_ms'])
+        core.stop_speech()
+
+    # A faster Speed setting: the take is stretched once, then played from the stretch cache
+    core._speed = 200
+    start = time.perf_counter()
+    core._stretched_recording('F2')
+    stretch = _ms(time.perf_counter() - start)
+    stretched_audio, _ = _time_plays(vk, core, 'F2')
+    core.close()
+    return {
+        'tts_key_to_audio_ms': tts_audio,
+        'tts_dispatch_ms': tts_dispatch,
+        'rec_key_to_audio_ms': rec_audio,
+        'rec_dispatch_ms': rec_dispatch,
+        'clips_key_to_audio_ms': clips_audio,
+        'clips_assembly_ms': clips_assembly,
+        'tts_uncached_key_to_audio_ms': _median(uncached),
+        'rec_stretch_3s_ms': stretch,
+        'rec_stretched_key_to_audio_ms': stretched_audio,
+    }
+
+
+def bench_config():
+    """Load and save of the config and a large bank."""
+    import voice_keyer_tts as vk
+    core = vk.KeyerCore()
+    bank = core.bank
+    bank.size = 500
+    for i, key in enumerate(bank.keys()):
+        bank.texts[key] = f"{EXAMPLE_TEXT} slot {i}"
+    bank.save()
+    bank.flush()
+
+    loads, saves, flushes, config_saves = [], [], [], []
+    for i in range(20):
+        start = time.perf_counter()
+        vk.MessageBank(bank.name).load()
+        loads.append(time.perf_counter() - start)
+
+        bank.texts['F1'] = f"{EXAMPLE_TEXT} edit {i}"
+        start = time.perf_counter()
+        bank.save()
+        saves.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        bank.flush()
+        flushes.append(time.perf_counter() - start)
+
+        core.macro_values['NR'] = str(i)
+        start = time.perf_counter()
+        core.save_config()
+        config_saves.append(time.perf_counter() - start)
+    core.close()
+    return {
+        'bank_load_500_ms': _ms(_median(loads)),
+        'bank_save_500_ms': _ms(_median(saves)),
+        'bank_write_500_ms': _ms(_median(flushes)),
+        'config_save_ms': _ms(_median(config_saves)),
+    }
+
+
+def bench_record_stop():
+    """Stopping a long take, and post-processing it, as after pressing Stop."""
+    import numpy as np
+    import voice_keyer_tts as vk
+    vk.load_audio_libraries()
+    home = vk.Path.home()
+    path = home / 'take.wav'
+    recorder = vk.StreamingRecorder(path, samplerate=SAMPLERATE, max_seconds=LONG_TAKE_SECONDS + 1,
+                                    ring_seconds=10.0)
+    recorder.start()
+    block = (0.3 * np.sin(np.arange(1024) / 7.0)).astype(np.float32).reshape(-1, 1)
+    frames = LONG_TAKE_SECONDS * SAMPLERATE
+    fed = 0
+    while fed < frames:
+        # Feed faster than real time, but never more than the writer can take
+        while recorder._write_pos - recorder._read_pos > 8 * SAMPLERATE:
+            time.sleep(0.005)
+        recorder._callback(block, len(block), None, None)
+        fed += len(block)
+    time.sleep(0.02)  # as when a key is pressed between writer passes
+    start = time.perf_counter()
+    recorder.stop()
+    stopped = time.perf_counter()
+    vk.process_recording(path, vk.RecordingArchive(home / 'archive'), 'F1', dict(vk.DEFAULT_PROCESSING))
+    processed = time.perf_counter()
+    return {
+        'record_stop_ms': _ms(stopped - start),
+        'record_process_ms': _ms(processed - stopped),
+    }
+
+
+def bench_input():
+    """Cost of an always-open input: callback time per block for pre-roll (idle and recording)
+    and for the receive recorder."""
+    import numpy as np
+    import voice_keyer_tts as vk
+    vk.load_audio_libraries()
+    monitor = vk.InputMonitor(SAMPLERATE)
+    monitor.start()
+    block = (3000 * np.sin(np.arange(vk.INPUT_BLOCKSIZE) / 7.0)).astype(np.int16).reshape(-1, 1)
+    blocks = INPUT_SECONDS * SAMPLERATE // len(block)
+
+    def run():
+        start = time.perf_counter()
+        for _ in range(blocks):
+            monitor._callback(block, len(block), None, None)
+        return (time.perf_counter() - start) / blocks * 1e6
+
+    idle = run()
+    recorder = vk.StreamingRecorder(vk.Path.home() / 'take.wav', samplerate=SAMPLERATE,
+                                    max_seconds=INPUT_SECONDS + 1, ring_seconds=INPUT_SECONDS + 1,
+                                    source=monitor, preroll=0.5)
+    recorder.start()
+    recording = run()
+    recorder.stop()
+    monitor.close()
+    memory = monitor.memory_bytes
+
+    # The receive recorder: a long ring and no level check
+    monitor = vk.InputMonitor(vk.DVR_SAMPLERATE, seconds=DVR_MINUTES * 60, threshold_db=None)
+    monitor.start()
+    dvr = run()
+    monitor.close()
+    return {
+        'input_idle_block_us': round(idle, 2),
+        'input_recording_block_us': round(recording, 2),
+        'input_memory_kb': round(memory / 1024, 1),
+        'dvr_block_us': round(dvr, 2),
+        'dvr_memory_kb': round(monitor.memory_bytes / 1024, 1),
+    }
+
+
+def bench_memory():
+    """Python heap (numpy buffers included) with many slots of each mode loaded.
+
+    Recordings are memory-mapped from their archive, so they only count
+    here if they had to be converted to the playback rate.
+    """
+    import voice_keyer_tts as vk
+    vk.load_audio_libraries()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    core = _start_core(vk)
+    bank = core.bank
+    bank.size = 2 * MEMORY_SLOTS
+    for i in range(MEMORY_SLOTS):
+        bank.texts[f"F{i + 1}"] = f"{EXAMPLE_TEXT} {i}"
+        key = f"F{MEMORY_SLOTS + i + 1}"
+        bank.modes[key] = 'rec'
+        bank.archive.put(key, _take(5.0), SAMPLERATE)
+    core._prerender_all()
+    _wait_renders(core)
+    core.recording_bank.load_all(bank.archive)
+    after = tracemalloc.take_snapshot()
+    used = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    tracemalloc.stop()
+    core.close()
+    return {f'memory_{2 * MEMORY_SLOTS}_slots_mb': round(used / (1024 * 1024), 2)}
+
+
+def bench_daemon():
+    """PLAY, STATUS and STOP sent to a --fake-audio daemon over UDP, checking each reply."""
+    import threading
+    import voice_keyer_tts as vk
+    vk.LATENCY.enabled = True
+    daemon = vk.KeyerDaemon(('127.0.0.1', 0), fake_audio=True)
+    daemon.start()
+    address = daemon.sock.getsockname()
+    daemon.message_slots['F1'] = EXAMPLE_TEXT
+    daemon._prerender_all()
+    _wait_renders(daemon)
+    server = threading.Thread(target=daemon.serve_forever, daemon=True)
+    server.start()
+
+    def send(command, expected=None):
+        reply = vk.send_command(command, address)
+        if expected is not None and reply != expected:
+            raise AssertionError(f"{command!r}: expected {expected!r}, got {reply!r}")
+        return reply
+
+    def status():
+        return json.loads(send('STATUS'))
+
+    try:
+        if not send('').startswith('ERR'):
+            raise AssertionError("an empty command was not rejected")
+        if not send('PLAY F99').startswith('ERR'):
+            raise AssertionError("an unknown slot was not rejected")
+        round_trips, plays = [], []
+        for _ in range(10):
+            start = time.perf_counter()
+            state = status()
+            round_trips.append(time.perf_counter() - start)
+            if state['state'] != 'idle':
+                raise AssertionError(f"not idle before PLAY: {state}")
+            vk.LATENCY.reset()
+            send('PLAY F1', 'OK')
+            deadline = time.perf_counter() + 5.0
+            while 'key to audio' not in vk.LATENCY.summary() and time.perf_counter() < deadline:
+                time.sleep(0.005)
+            state = status()
+            if state['state'] != 'playing' or state['slot'] != 'F1':
+                raise AssertionError(f"not playing F1 after PLAY: {state}")
+            plays.append(vk.LATENCY.summary()['key to audio']['p50_ms'])
+            send('STOP', 'OK')
+            deadline = time.perf_counter() + 1.0
+            while status()['state'] != 'idle':
+                if time.perf_counter() > deadline:
+                    raise AssertionError("still playing after STOP")
+                time.sleep(0.01)
+    finally:
+        daemon.shutdown()
+        server.join(5.0)
+    return {
+        'daemon_command_ms': _ms(_median(round_trips)),
+        'daemon_key_to_audio_ms': _median(plays),
+    }
+
+
+BENCHMARKS = {
+    'startup': bench_startup,
+    'latency': bench_latency,
+    'config': bench_config,
+    'record_stop': bench_record_stop,
+    'input': bench_input,
+    'memory': bench_memory,
+    'daemon': bench_daemon,
+}
+
+# Benchmarks whose single samples are noisy: run this many times and report medians
+RUNS = {'startup': STARTUP_RUNS}
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+def run_child(name):
+    """Run one benchmark in this process and print its metrics as JSON."""
+    sys.path.insert(0, SCRIPT_DIR)
+    install_fake_backends()
+    metrics = BENCHMARKS[name]()
+    sys.stdout.flush()
+    print('BENCHMARK ' + json.dumps(metrics))
+
+
+def run_benchmark(name, runs=1):
+    """Run a benchmark runs times, each in a fresh process; return the median of each metric."""
+    samples = []
+    for _ in range(runs):
+        metrics = _run_child_process(name)
+        if metrics is None:
+            return None
+        samples.append(metrics)
+    return {metric: _median(s[metric] for s in samples) for metric in samples[0]}
+
+
+def _run_child_process(name):
+    """Run a benchmark in a fresh process with an empty home directory."""
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home, USERPROFILE=home)
+        env.pop('VOICE_KEYER_LATENCY', None)
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', name],
+                                env=env, capture_output=True, text=True, timeout=600)
+    for line in result.stdout.splitlines():
+        if line.startswith('BENCHMARK '):
+            return json.loads(line[len('BENCHMARK '):])
+    print(f"  {name} failed:\n{result.stdout}{result.stderr}")
+    return None
+
+
+def load_baseline():
+    try:
+        with open(BASELINE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def check(metric, value, baseline):
+    """Return "OK", "REGRESSED" or "NEW" for a metric against its baseline value."""
+    if baseline is None:
+        return "NEW"
+    unit = metric.rsplit('_', 1)[-1]
+    limit = baseline * (1 + TOLERANCE) + SLACK.get(unit, 0.0)
+    return "OK" if value <= limit else "REGRESSED"
+
+
+def main():
+    args = sys.argv[1:]
+    if args[:1] == ['--child']:
+        run_child(args[1])
+        return 0
+    update = '--update-baseline' in args
+    names = [a for a in args if not a.startswith('--')] or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown benchmark: {', '.join(unknown)} (choose from {', '.join(BENCHMARKS)})")
+        return 2
+
+    baseline = load_baseline()
+    results = {}
+    ok = True
+    for name in names:
+        print(f"\n{name}:")
+        metrics = run_benchmark(name, RUNS.get(name, 1))
+        if metrics is None:
+            ok = False
+            continue
+        results.update(metrics)
+        for metric, value in metrics.items():
+            status = check(metric, value, baseline.get(metric))
+            reference = baseline.get(metric)
+            reference = "-" if reference is None else f"{reference:g}"
+            print(f"  {metric:<32} {value:>10g}  (baseline {reference}) {status}")
+            ok = ok and status != "REGRESSED"
+
+    if update:
+        baseline.update(results)
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump(dict(sorted(baseline.items())), f, indent=2)
+            f.write('\n')
+        print(f"\nBaseline written to {BASELINE_FILE}")
+        return 0
+    print("\nAll benchmarks within baseline" if ok else "\nRegressions found")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,6 +4,7 @@ Build script for Voice_Keyer_TTS standalone executable.
 
 Usage:
     python build.py
+    python build.py --measure-startup   (only measure startup time)
 
 Requirements:
     pip install pyinstaller
@@ -16,6 +17,11 @@ Output:
 import subprocess
 import sys
 import os
+import time
+
+# Startup-time targets: seconds from process launch until the window is drawn
+STARTUP_TARGET_SCRIPT = 1.0
+STARTUP_TARGET_EXE = 2.0
 
 
 def check_pyinstaller():
@@ -38,6 +44,7 @@ def check_dependencies():
         'sounddevice': 'sounddevice',
         'soundfile': 'soundfile',
         'numpy': 'numpy',
+        'serial': 'pyserial',
     }
     for import_name, pip_name in packages.items():
         try:
@@ -50,6 +57,35 @@ def check_dependencies():
         subprocess.check_call([sys.executable, '-m', 'pip', 'install'] + missing)
 
 
+def time_startup(command, target, runs=3):
+    """Run command with --measure-startup and report the best wall-clock time."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(command + ['--measure-startup'], capture_output=True)
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            print(f"  {' '.join(command)} failed to start")
+            return False
+        best = elapsed if best is None else min(best, elapsed)
+    status = "OK" if best <= target else "SLOW"
+    print(f"  {' '.join(command)}: {best:.2f}s (target {target:.1f}s) {status}")
+    return best <= target
+
+
+def measure_startup():
+    """Measure startup time of the script and, if built, the executable."""
+    print("\nMeasuring startup time...")
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    ok = time_startup([sys.executable, os.path.join(script_dir, 'voice_keyer_tts.py')],
+                      STARTUP_TARGET_SCRIPT)
+    exe_name = 'Voice_Keyer_TTS.exe' if sys.platform == 'win32' else 'Voice_Keyer_TTS'
+    exe = os.path.join(script_dir, 'dist', exe_name)
+    if os.path.exists(exe):
+        ok = time_startup([exe], STARTUP_TARGET_EXE) and ok
+    return ok
+
+
 def build():
     """Build the executable."""
     print("=" * 50)
@@ -85,10 +121,14 @@ def build():
             shutil.copy2(src, dst)
             print(f"\nExecutable copied to: {dst}")
             print("(Also available in dist/ folder)")
+
+        measure_startup()
     else:
         print("\nBuild failed. Check the errors above.")
         sys.exit(1)
 
 
 if __name__ == '__main__':
+    if '--measure-startup' in sys.argv[1:]:
+        sys.exit(0 if measure_startup() else 1)
     build()
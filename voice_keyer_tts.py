@@ -5,48 +5,2916 @@ Uses TTS to generate voice messages with a female voice
 Supports recorded voice messages via sounddevice/soundfile
 """
 
+import time
+
+_START_TIME = time.perf_counter()
+
 import tkinter as tk
-from tkinter import messagebox, ttk
-import pyttsx3
+from tkinter import filedialog, messagebox, simpledialog, ttk
+import sys
+import re
 import json
+import os
+import queue
+import hashlib
+import math
+import bisect
+import csv
+import platform
+from functools import lru_cache
+import socket
+import tempfile
+import argparse
+import multiprocessing
 import threading
-import numpy as np
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
 from pathlib import Path
 
-# Optional recording support
-try:
-    import sounddevice as sd
-    import soundfile as sf
+# Audio libraries are imported in the background by load_audio_libraries()
+# so the window can be drawn before numpy/sounddevice/soundfile are loaded.
+np = None
+sd = None
+sf = None
+RECORDING_AVAILABLE = False
+
+
+def load_audio_libraries(need_device=True):
+    """Import numpy, sounddevice and soundfile; return True if recording is available.
+
+    With need_device=False a missing sounddevice/PortAudio is tolerated, for
+    running against FakeOutputStream instead of a sound card.
+    """
+    global np, sd, sf, RECORDING_AVAILABLE
+    try:
+        import numpy
+        import soundfile
+    except (ImportError, OSError):
+        RECORDING_AVAILABLE = False
+        return False
+    try:
+        import sounddevice
+    except (ImportError, OSError):
+        # OSError: sounddevice is installed but the PortAudio library is missing
+        if need_device:
+            RECORDING_AVAILABLE = False
+            return False
+        sounddevice = None
+    np, sd, sf = numpy, sounddevice, soundfile
     RECORDING_AVAILABLE = True
-except ImportError:
-    RECORDING_AVAILABLE = False
+    return True
+
+
+def output_samplerate(default=44100, device=None):
+    """Return the native sample rate of an output device (default: the default device)."""
+    try:
+        info = sd.query_devices(kind="output") if device is None else sd.query_devices(device)
+        return int(info["default_samplerate"])
+    except Exception as e:
+        print(f"Error querying output device: {e}")
+        return default
+
 
+def input_samplerate(preferred, device=None):
+    """Return preferred if the input device supports it, else the device's native rate."""
+    try:
+        sd.check_input_settings(device=device, samplerate=preferred, channels=1, dtype="float32")
+        return preferred
+    except Exception:
+        pass
+    try:
+        info = sd.query_devices(kind="input") if device is None else sd.query_devices(device)
+        return int(info["default_samplerate"])
+    except Exception:
+        return preferred
+
+
+def device_arg(text):
+    """Return a sounddevice device argument for a setting: None (default), an index or a name."""
+    text = (text or "").strip()
+    if not text:
+        return None
+    return int(text) if text.isdigit() else text
+
+
+def is_transmit_output(device):
+    """Return True if device (from device_arg()) is the default output, which messages are sent on."""
+    if device is None:
+        return True
+    try:
+        info = sd.query_devices(device)
+        default = sd.query_devices(kind="output")
+    except Exception:
+        return False  # an unknown device fails when the replay stream is opened
+    return (info.get("name"), info.get("hostapi")) == (default.get("name"), default.get("hostapi"))
+
+CONFIG_FILE = Path.home() / ".voice_keyer_tts_config.json"
 RECORDINGS_DIR = Path.home() / ".voice_keyer_recordings"
+RAW_RECORDINGS_DIR = RECORDINGS_DIR / "raw"  # unprocessed takes, kept so processing can be re-run
+BANKS_DIR = Path.home() / ".voice_keyer_banks"
+WAVEFORM_BINS = 64  # min/max pairs kept per recording for the thumbnail
+CLIPS_DIR = RECORDINGS_DIR / "clips"  # clip bank archive, shared by all banks
+ARCHIVE_SLACK_FRAMES = 10 * 48000  # dead audio a recording archive may hold before it is rewritten
 
+# Message banks: the default bank keeps the original F1-F8 slots and recordings
+DEFAULT_BANK = "Default"
+BANK_SLOTS = 8
+VISIBLE_ROWS = 8  # slot rows built in the window; scrolling re-binds them
+TTS_CACHE_DIR = Path.home() / ".voice_keyer_tts_cache"
+
+# Default limit for a single slot recording, in seconds
+RECORDING_MAX_SECONDS = 120
+
+# Always-open input (InputMonitor) for pre-roll and voice-activated recording
+PREROLL_MAX_SECONDS = 2.0  # size of the int16 input ring; longest pre-roll offered
+VAD_PREROLL = 0.3  # least pre-roll for a voice-started take, so its onset is kept
+VAD_THRESHOLD_DB = -40.0  # block RMS (dBFS) counted as voice
+VAD_HANGOVER = 1.0  # seconds of silence that end a voice-started take
+INPUT_BLOCKSIZE = 512
+
+# Receive-audio recorder (DVR): last minutes of the receiver, replayed with F9-F11
+DVR_SAMPLERATE = 16000  # asked of the receive input; plenty for SSB/FM audio
+DVR_MAX_MINUTES = 30
+DVR_REPLAY_SECONDS = (5, 10, 30)
+
+# Input level meter shown while recording
+METER_INTERVAL_MS = 50  # Tk poll rate
+METER_FLOOR_DB = -60.0
+CLIP_LEVEL = 0.999  # peak (full scale = 1.0) counted as clipping
+
+# Headless daemon (--daemon): local UDP address the command socket listens on
+DAEMON_ADDRESS = ("127.0.0.1", 7373)
+
+# Latency instrumentation (--latency): histogram bucket upper edges and samples kept per stage
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+LATENCY_WINDOW = 500
+
+# Cache limits for pre-rendered TTS audio
+TTS_CACHE_MAX_MEMORY = 64 * 1024 * 1024
+TTS_CACHE_MAX_DISK = 256 * 1024 * 1024
+
+# Speed: TTS is rendered at one engine rate and time-stretched to the Speed setting
+TTS_RENDER_RATE = 150  # Speed at which messages play unstretched (recordings at their own pace)
+SPEED_STEP = 5  # Speed is rounded to steps; each step's stretched audio is cached
+STRETCH_CACHE_MAX_MEMORY = 64 * 1024 * 1024
+
+
+FEMALE_VOICE_NAMES = ['zira', 'hazel', 'samantha', 'victoria', 'karen']
+
+# Template macros usable in slot text, e.g. "{CALL} you are {RST} {NR}"
+MACRO_NAMES = ("MYCALL", "CALL", "NR", "RST")
+MACRO_PATTERN = re.compile(r"\{(" + "|".join(MACRO_NAMES) + r")\}")
+
+# Pause inserted where separately rendered fragments are joined, in seconds
+FRAGMENT_GAP = 0.06
+
+# Clip bank: short recorded words joined at key time into serials and callsigns
+NATO_ALPHABET = ("ALFA", "BRAVO", "CHARLIE", "DELTA", "ECHO", "FOXTROT", "GOLF", "HOTEL",
+                 "INDIA", "JULIETT", "KILO", "LIMA", "MIKE", "NOVEMBER", "OSCAR", "PAPA",
+                 "QUEBEC", "ROMEO", "SIERRA", "TANGO", "UNIFORM", "VICTOR", "WHISKEY",
+                 "XRAY", "YANKEE", "ZULU")
+CLIP_WORDS = tuple("0123456789") + NATO_ALPHABET + ("FIVE NINE", "ZONE", "SLASH")
+CLIP_ALIASES = {"59": "FIVE NINE", "5NN": "FIVE NINE", "/": "SLASH", "ALPHA": "ALFA",
+                "JULIET": "JULIETT", "X-RAY": "XRAY"}
+CLIP_KEY_PREFIX = "clip:"  # recording keys of clips, e.g. "clip:ALFA"
+CLIP_CROSSFADE = 0.015  # seconds each pair of clips overlaps
+CLIP_TRIM_LEVEL = 0.005  # clips are cut tight to the first/last sample above this
+
+
+def has_macros(text):
+    return MACRO_PATTERN.search(text) is not None
+
+
+def _speakable(text):
+    return any(c.isalnum() for c in text)
+
+
+def static_fragments(text):
+    """Return the fixed (non-macro) pieces of a template that need rendering."""
+    return [part.strip() for part in MACRO_PATTERN.split(text)[::2] if _speakable(part)]
+
+
+def expand_fragments(text, values):
+    """Split a template into the texts to render, substituting macro values.
+
+    Static text and each macro value become separate fragments, so static
+    parts can be pre-rendered and only the values synthesized at key time.
+    Empty macro values are skipped.
+    """
+    fragments = []
+    for i, part in enumerate(MACRO_PATTERN.split(text)):
+        if i % 2:
+            part = values.get(part, "")
+        part = part.strip()
+        if _speakable(part):
+            fragments.append(part)
+    return fragments
+
+
+def expand_macros(text, values):
+    """Return text with every macro replaced by its value."""
+    return MACRO_PATTERN.sub(lambda m: values.get(m.group(1), ""), text)
+
+
+RESAMPLE_ZERO_CROSSINGS = 16  # half-length of the resampling filter, in input/output periods
+STRETCH_FRAME = 0.03  # time-stretch frame length, in seconds (half of it is the output hop)
+STRETCH_TOLERANCE = 0.008  # how far a frame may move to line up with the previous one
+
+
+@lru_cache(maxsize=16)
+def _polyphase_filter(up, down):
+    """Kaiser-windowed sinc low-pass for resampling by up/down, split into up phases.
+
+    Row p holds the taps applied to the input window for output phase p,
+    already reversed so each output sample is one dot product.
+    """
+    factor = max(up, down)
+    taps = int(np.ceil(2 * RESAMPLE_ZERO_CROSSINGS * factor / up))  # per phase
+    length = taps * up
+    center = length // 2
+    cutoff = 0.5 / factor  # cycles per sample at the upsampled rate
+    t = np.arange(length) - center
+    window = np.i0(8.0 * np.sqrt(np.clip(1 - (t / center) ** 2, 0, None))) / np.i0(8.0)
+    h = 2 * cutoff * np.sinc(2 * cutoff * t) * window * up
+    return h.reshape(taps, up).T[:, ::-1].astype(np.float32), center
+
+
+def resample(data, samplerate, target_rate):
+    """Return 1-D float32 data resampled from samplerate to target_rate.
+
+    Polyphase filtering: output samples sharing a filter phase are computed
+    together as one matrix product over zero-copy sliding windows of the
+    input, so the work is fully vectorized.
+    """
+    g = math.gcd(int(samplerate), int(target_rate))
+    up, down = int(target_rate) // g, int(samplerate) // g
+    bank, center = _polyphase_filter(up, down)
+    taps = bank.shape[1]
+    n_out = -(-len(data) * up // down)
+    padded = np.concatenate((np.zeros(taps - 1, np.float32), data.astype(np.float32, copy=False),
+                             np.zeros(taps + down, np.float32)))
+    windows = np.lib.stride_tricks.sliding_window_view(padded, taps)
+    out = np.empty(n_out, dtype=np.float32)
+    for r in range(min(up, n_out)):
+        t = r * down + center
+        rows = windows[t // up::down][:len(range(r, n_out, up))]
+        out[r::up] = rows @ bank[t % up]
+    return out
+
+
+def convert_rate(data, samplerate, target_rate):
+    """Return mono float32 data at target_rate."""
+    if data.ndim > 1:
+        data = data.mean(axis=1)
+    src = data.astype(np.float32)
+    if data.dtype == np.int16:
+        src *= 1.0 / 32768
+    if samplerate == target_rate:
+        return src
+    return resample(src, samplerate, target_rate)
+
+
+def time_stretch(data, samplerate, factor):
+    """Return mono float32 data played factor times as fast (> 1 = shorter), at the same pitch.
+
+    WSOLA: Hann-windowed frames are overlap-added at a fixed output hop
+    while their read position advances factor times as fast. Each frame is
+    moved (by up to STRETCH_TOLERANCE) to where the input best continues
+    the frame before it; all candidate positions for a frame are scored
+    with one cross-correlation, and frames are read as zero-copy sliding
+    windows of the input.
+    """
+    src = data.astype(np.float32)
+    if data.dtype == np.int16:
+        src *= 1.0 / 32768
+    if src.ndim > 1:
+        src = src.mean(axis=1)
+    frame = 2 * int(STRETCH_FRAME * samplerate / 2)
+    if factor == 1 or len(src) < frame:
+        return src
+    hop = frame // 2
+    tolerance = int(STRETCH_TOLERANCE * samplerate)
+    n_out = int(round(len(src) / factor))
+    n_frames = -(-n_out // hop) + 1
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(frame) / frame)).astype(np.float32)
+    padded = np.concatenate((np.zeros(tolerance, np.float32), src,
+                             np.zeros(frame + 2 * tolerance + int(hop * factor) + hop, np.float32)))
+    windows = np.lib.stride_tricks.sliding_window_view(padded, frame)
+    out = np.zeros(n_frames * hop + frame, dtype=np.float32)
+    previous = None
+    for k in range(n_frames):
+        nominal = tolerance + int(round(k * hop * factor))
+        if previous is None:
+            chosen = nominal
+        else:
+            region = padded[nominal - tolerance:nominal + tolerance + frame]
+            scores = np.correlate(region, windows[previous + hop], mode="valid")
+            chosen = nominal - tolerance + int(np.argmax(scores))
+        out[k * hop:k * hop + frame] += windows[chosen] * window
+        previous = chosen
+    return out[:n_out]
+
+
+def trim_silence_edges(data, threshold=0.01):
+    """Cut leading and trailing samples quieter than threshold."""
+    loud = np.flatnonzero(np.abs(data) > threshold)
+    if len(loud) == 0:
+        return data[:0]
+    return data[loud[0]:loud[-1] + 1]
+
+
+def join_fragments(entries, gap=FRAGMENT_GAP):
+    """Concatenate rendered (data, samplerate) fragments into one buffer."""
+    samplerate = entries[0][1]
+    silence = np.zeros(int(gap * samplerate), dtype=np.float32)
+    pieces = []
+    for data, rate in entries:
+        if pieces:
+            pieces.append(silence)
+        pieces.append(trim_silence_edges(convert_rate(data, rate, samplerate)))
+    return np.concatenate(pieces), samplerate
+
+
+class LatencyStats:
+    """Rolling latency samples per stage, shown in the latency panel and exported.
+
+    Stages are measured from a key being pressed to its first sample at the
+    DAC, around engine start-up, synthesis, file decoding and recording.
+    While disabled (the default) now() returns None and add()/since() return
+    at once, so the instrumentation points cost almost nothing.
+    """
+
+    def __init__(self, enabled=False, window=LATENCY_WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self._samples = {}  # stage -> deque of seconds
+        self._lock = threading.Lock()
+
+    def now(self):
+        """Return a start time for since(), or None while disabled."""
+        return time.perf_counter() if self.enabled else None
+
+    def add(self, stage, seconds):
+        if not self.enabled or seconds is None:
+            return
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def since(self, stage, start):
+        """Record the time elapsed since start (from now())."""
+        if start is not None:
+            self.add(stage, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self):
+        """Return {stage: {count, mean/p50/p95/max in ms, histogram}} for every stage."""
+        with self._lock:
+            stages = {stage: sorted(samples) for stage, samples in self._samples.items()}
+        summary = {}
+        for stage, samples in sorted(stages.items()):
+            ms = [v * 1000 for v in samples]
+            histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)  # last bucket: above the top edge
+            for v in ms:
+                histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, v)] += 1
+            summary[stage] = {
+                "count": len(ms),
+                "mean_ms": round(sum(ms) / len(ms), 3),
+                "p50_ms": round(ms[len(ms) // 2], 3),
+                "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+                "max_ms": round(ms[-1], 3),
+                "histogram": histogram,
+            }
+        return summary
+
+    def export(self, path):
+        """Write the summary to path as CSV (.csv) or JSON (anything else)."""
+        path = Path(path)
+        summary = self.summary()
+        if path.suffix.lower() == ".csv":
+            buckets = [f"le_{edge}ms" for edge in LATENCY_BUCKETS_MS] + [f"gt_{LATENCY_BUCKETS_MS[-1]}ms"]
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["stage", "count", "mean_ms", "p50_ms", "p95_ms", "max_ms"] + buckets)
+                for stage, row in summary.items():
+                    writer.writerow([stage, row["count"], row["mean_ms"], row["p50_ms"],
+                                     row["p95_ms"], row["max_ms"]] + row["histogram"])
+        else:
+            report = {
+                "machine": platform.node(),
+                "platform": platform.platform(),
+                "python": platform.python_version(),
+                "buckets_ms": list(LATENCY_BUCKETS_MS),
+                "stages": summary,
+            }
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+
+# Shared by every component; enabled by --latency or VOICE_KEYER_LATENCY=1
+LATENCY = LatencyStats(enabled=bool(os.environ.get("VOICE_KEYER_LATENCY")))
+
+_HISTOGRAM_BARS = " \u2581\u2582\u2583\u2584\u2585\u2586\u2587\u2588"
+
+
+def format_latency_summary(summary):
+    """Return a LatencyStats summary as a text table with a small histogram per stage."""
+    if not summary:
+        return "No samples yet."
+    lines = [f"{'stage':<26}{'n':>6}{'mean':>9}{'p50':>9}{'p95':>9}{'max':>9}  "
+             f"histogram (ms: <={', '.join(str(e) for e in LATENCY_BUCKETS_MS)}, more)"]
+    for stage, row in summary.items():
+        top = max(row["histogram"])
+        bars = "".join(_HISTOGRAM_BARS[-(-count * 8 // top)] for count in row["histogram"])
+        lines.append(f"{stage:<26}{row['count']:>6}{row['mean_ms']:>9.1f}{row['p50_ms']:>9.1f}"
+                     f"{row['p95_ms']:>9.1f}{row['max_ms']:>9.1f}  {bars}")
+    return "\n".join(lines)
+
+
+class ConfigStore:
+    """Persists the config file from a background thread.
+
+    save() only hands over the latest snapshot. The writer waits until saves
+    stop arriving, skips the write if the content did not change, and
+    replaces the file atomically (temp file, fsync, rename), so a crash can
+    never leave a truncated config behind.
+    """
+
+    def __init__(self, path, delay=0.5, max_delay=5.0):
+        self.path = Path(path)
+        self.delay = delay
+        self.max_delay = max_delay
+        self._pending = None
+        self._last_written = None
+        self._flush_now = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def load(self):
+        """Return the saved config dict ({} if missing or unreadable)."""
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                text = f.read()
+            config = json.loads(text)
+        except (OSError, ValueError) as e:
+            # Keep the damaged file for inspection instead of overwriting it
+            print(f"Error loading config: {e}")
+            try:
+                os.replace(self.path, self.path.with_name(self.path.name + ".corrupt"))
+            except OSError:
+                pass
+            return {}
+        self._last_written = json.dumps(config, indent=2)
+        return config
+
+    def save(self, config):
+        """Queue config to be written; a no-op if it matches what is on disk."""
+        text = json.dumps(config, indent=2)
+        with self._lock:
+            if self._pending is None and text == self._last_written:
+                return
+            self._pending = text
+            self._idle.clear()
+        self._wake.set()
+
+    def flush(self, timeout=5.0):
+        """Write any pending config now and wait for it to reach the disk."""
+        self._flush_now = True
+        self._wake.set()
+        self._idle.wait(timeout)
+
+    def _write(self, text):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _worker(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            # Coalesce bursts of saves (typing, slider drags) into one write
+            deadline = time.monotonic() + self.max_delay
+            while not self._flush_now and time.monotonic() < deadline:
+                if not self._wake.wait(self.delay):
+                    break
+                self._wake.clear()
+            self._flush_now = False
+
+            with self._lock:
+                text, self._pending = self._pending, None
+            if text is not None and text != self._last_written:
+                try:
+                    self._write(text)
+                    self._last_written = text
+                except Exception as e:
+                    print(f"Error saving config: {e}")
+            with self._lock:
+                if self._pending is None:
+                    self._idle.set()
+
+
+def _bank_file_name(name):
+    return re.sub(r"[^\w\- ]", "_", name).strip() or "_"
+
+
+class MessageBank:
+    """A named set of message slots (F1, F2, ...) stored in its own file.
+
+    Banks are only read from disk when first used, and each has its own
+    recordings folder; the default bank uses the original recordings folder.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.path = BANKS_DIR / f"{_bank_file_name(name)}.json"
+        self.texts = {}
+        self.modes = {}  # "tts" or "rec" per slot
+        self.processing = {}  # slot -> post-processing overrides
+        self.size = BANK_SLOTS
+        self._store = None
+        self._archive = None
+
+    @property
+    def loaded(self):
+        return self._store is not None
+
+    def load(self):
+        """Read the bank file (once) and return self."""
+        if self._store is None:
+            BANKS_DIR.mkdir(exist_ok=True)
+            self._store = ConfigStore(self.path)
+            data = self._store.load()
+            self.update_from_config(data.get('messages', {}), data.get('processing', {}))
+            self.size = max(self.size, data.get('size', BANK_SLOTS))
+        return self
+
+    def update_from_config(self, messages, processing=None):
+        """Fill slots from a config 'messages' dict (old string or new dict format)."""
+        for key, val in messages.items():
+            if isinstance(val, dict):
+                self.texts[key] = val.get("text", "")
+                self.modes[key] = val.get("mode", "tts")
+            else:
+                # Old format: plain string
+                self.texts[key] = val
+                self.modes[key] = "tts"
+            number = key[1:]
+            if number.isdigit():
+                self.size = max(self.size, int(number))
+        self.processing.update(processing or {})
+
+    def keys(self):
+        return [f"F{i}" for i in range(1, self.size + 1)]
+
+    def to_config(self):
+        messages = {}
+        for key in self.keys():
+            text = self.texts.get(key, "")
+            mode = self.modes.get(key, "tts")
+            if text or mode != "tts":
+                messages[key] = {"mode": mode, "text": text}
+        return {'size': self.size, 'messages': messages, 'processing': self.processing}
+
+    def save(self):
+        self.load()._store.save(self.to_config())
+
+    def flush(self):
+        if self._store is not None:
+            self._store.flush()
+
+    @property
+    def recordings_dir(self):
+        if self.name == DEFAULT_BANK:
+            return RECORDINGS_DIR
+        return RECORDINGS_DIR / "banks" / _bank_file_name(self.name)
+
+    @property
+    def archive(self):
+        """The bank's RecordingArchive of processed recordings."""
+        if self._archive is None:
+            self._archive = RecordingArchive(self.recordings_dir)
+        return self._archive
+
+    def raw_recording_path(self, key):
+        """Return the unprocessed take for a slot."""
+        return self.recordings_dir / "raw" / f"{key}.wav"
+
+
+class TTSJob:
+    """A unit of work for TTSService; result is available through job.future."""
+
+    SPEAK = "speak"
+    RENDER = "render"
+    CONFIGURE = "configure"
+    FIND_VOICE = "find_voice"
+
+    def __init__(self, kind, text=None, path=None, properties=None):
+        self.kind = kind
+        self.text = text
+        self.path = path
+        self.properties = properties or {}
+        self.future = Future()
+        self.cancelled = False
+        self.queued_at = time.perf_counter()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def wait_time(self):
+        return (self.started_at or self.queued_at) - self.queued_at
+
+    @property
+    def run_time(self):
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+
+class TTSService:
+    """Owns a single pyttsx3 engine on a dedicated worker thread.
+
+    Jobs (speak, render to file, change rate/volume/voice) are queued and
+    run in order on the same engine, so driver initialization is paid once.
+    cancel() drops queued jobs and interrupts the utterance being spoken.
+    """
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.init_time = None
+        self.timings = deque(maxlen=200)  # (kind, wait, run) per finished job
+        self._jobs = queue.Queue()
+        self._current = None
+        self._properties = {}
+        self._engine = None
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def speak(self, text, **properties):
+        """Queue text to be spoken live; properties are rate/volume/voice."""
+        return self._submit(TTSJob(TTSJob.SPEAK, text=text, properties=properties))
+
+    def render_to_file(self, text, path, **properties):
+        """Queue text to be synthesized into an audio file at path."""
+        return self._submit(TTSJob(TTSJob.RENDER, text=text, path=path, properties=properties))
+
+    def configure(self, **properties):
+        """Queue a change of rate/volume/voice for subsequent jobs."""
+        return self._submit(TTSJob(TTSJob.CONFIGURE, properties=properties))
+
+    def find_female_voice(self):
+        """Queue a search of the installed voices; result is a voice id or None."""
+        return self._submit(TTSJob(TTSJob.FIND_VOICE))
+
+    def cancel(self):
+        """Drop all queued jobs and interrupt the one being spoken."""
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            job.cancelled = True
+            job.future.cancel()
+        current = self._current
+        if current is not None:
+            current.cancelled = True
+
+    def _submit(self, job):
+        self._jobs.put(job)
+        return job
+
+    def _apply_properties(self, properties):
+        for name, value in properties.items():
+            if value is not None and self._properties.get(name) != value:
+                self._engine.setProperty(name, value)
+                self._properties[name] = value
+
+    def _on_word(self, name, location, length):
+        # pyttsx3 can only be interrupted from inside its own callbacks
+        current = self._current
+        if current is not None and current.cancelled:
+            self._engine.stop()
+
+    def _find_female_voice(self):
+        voices = self._engine.getProperty('voices')
+        for voice in voices:
+            name = voice.name.lower()
+            if 'female' in name or 'woman' in name:
+                return voice.id
+            if any(n in name for n in FEMALE_VOICE_NAMES):
+                return voice.id
+        if len(voices) > 1:
+            return voices[1].id
+        return None
+
+    def _run_job(self, job):
+        self._apply_properties(job.properties)
+        if job.kind == TTSJob.SPEAK:
+            self._engine.say(job.text)
+            self._engine.runAndWait()
+        elif job.kind == TTSJob.RENDER:
+            self._engine.save_to_file(job.text, str(job.path))
+            self._engine.runAndWait()
+        elif job.kind == TTSJob.FIND_VOICE:
+            return self._find_female_voice()
+        return None
+
+    def _worker(self):
+        start = time.perf_counter()
+        try:
+            import pyttsx3
+            self._engine = pyttsx3.init()
+            self._engine.connect('started-word', self._on_word)
+        except Exception as e:
+            print(f"Error starting TTS engine: {e}")
+        self.init_time = time.perf_counter() - start
+        LATENCY.add("tts engine init", self.init_time)
+        if self.verbose:
+            print(f"TTS engine init: {self.init_time * 1000:.1f} ms")
+
+        while True:
+            job = self._jobs.get()
+            if job.cancelled or not job.future.set_running_or_notify_cancel():
+                continue
+            self._current = job
+            job.started_at = time.perf_counter()
+            try:
+                if self._engine is None:
+                    raise RuntimeError("TTS engine unavailable")
+                result = self._run_job(job)
+            except Exception as e:
+                job.finished_at = time.perf_counter()
+                job.future.set_exception(e)
+            else:
+                job.finished_at = time.perf_counter()
+                job.future.set_result(result)
+            finally:
+                self._current = None
+            self.timings.append((job.kind, job.wait_time, job.run_time))
+            if job.kind in (TTSJob.SPEAK, TTSJob.RENDER):
+                LATENCY.add("tts queue wait", job.wait_time)
+                LATENCY.add(f"tts {job.kind}", job.run_time)
+            if self.verbose:
+                print(f"TTS {job.kind}: waited {job.wait_time * 1000:.1f} ms, "
+                      f"ran {job.run_time * 1000:.1f} ms")
+
+    def timing_summary(self):
+        """Return {kind: (count, mean wait, mean run)} over recent jobs, in seconds."""
+        summary = {}
+        for kind, wait, run in list(self.timings):  # the worker appends while we read
+            count, total_wait, total_run = summary.get(kind, (0, 0.0, 0.0))
+            summary[kind] = (count + 1, total_wait + wait, total_run + (run or 0.0))
+        return {kind: (count, total_wait / count, total_run / count)
+                for kind, (count, total_wait, total_run) in summary.items()}
+
+
+class TTSCache:
+    """Pre-rendered TTS audio, kept in memory and on disk.
+
+    Entries are keyed by text, voice id, rate and volume and are evicted
+    least-recently-used when either the memory or disk budget is exceeded.
+    With samplerate set, renders are converted to it once when loaded, so
+    the memory copy is ready for the output stream.
+    """
+
+    def __init__(self, cache_dir=TTS_CACHE_DIR, max_memory=TTS_CACHE_MAX_MEMORY,
+                 max_disk=TTS_CACHE_MAX_DISK, samplerate=None):
+        self.samplerate = samplerate
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(exist_ok=True)
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self._memory = OrderedDict()  # key -> (data, samplerate)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(text, voice_id, rate, volume):
+        """Return the cache key for a message rendered with the given settings."""
+        raw = json.dumps([text, voice_id, int(rate), round(float(volume), 2)])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.wav"
+
+    def get(self, key):
+        """Return (data, samplerate) for a cached render, or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        path = self._path(key)
+        if not path.exists():
+            return None
+        start = LATENCY.now()
+        try:
+            data, samplerate = sf.read(str(path), dtype="float32")
+            os.utime(path)  # Mark as recently used for disk eviction
+        except Exception as e:
+            print(f"Error reading TTS cache: {e}")
+            return None
+        if self.samplerate is not None and (samplerate != self.samplerate or data.ndim > 1):
+            data, samplerate = convert_rate(data, samplerate, self.samplerate), self.samplerate
+        LATENCY.since("tts cache read", start)
+        self._put_memory(key, data, samplerate)
+        return data, samplerate
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._memory:
+                return True
+        return self._path(key).exists()
+
+    def render(self, tts, key, text, voice_id, rate, volume):
+        """Synthesize text into the cache through a TTSService and return (data, samplerate)."""
+        path = self._path(key)
+        tmp_path = self.cache_dir / f"{key}.tmp.wav"
+        job = tts.render_to_file(text, tmp_path, voice=voice_id, rate=rate, volume=volume)
+        job.future.result()
+        os.replace(tmp_path, path)
+        self._trim_disk()
+        return self.get(key)
+
+    def discard(self, key):
+        """Drop an entry from memory and disk."""
+        with self._lock:
+            entry = self._memory.pop(key, None)
+            if entry is not None:
+                self._memory_bytes -= entry[0].nbytes
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _put_memory(self, key, data, samplerate):
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= old[0].nbytes
+            self._memory[key] = (data, samplerate)
+            self._memory_bytes += data.nbytes
+            while self._memory_bytes > self.max_memory and len(self._memory) > 1:
+                _, (evicted, _) = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.nbytes
+
+    def _trim_disk(self):
+        """Delete least-recently-used files until the disk budget is met."""
+        try:
+            files = [(p.stat(), p) for p in self.cache_dir.glob("*.wav")
+                     if not p.name.endswith(".tmp.wav")]
+        except OSError:
+            return
+        total = sum(st.st_size for st, _ in files)
+        for st, p in sorted(files, key=lambda f: f[0].st_mtime):
+            if total <= self.max_disk:
+                break
+            try:
+                p.unlink()
+                total -= st.st_size
+            except OSError:
+                pass
+
+
+class StretchCache:
+    """Time-stretched copies of rendered and recorded audio, one per source and speed.
+
+    A source is any hashable that changes when its audio does (e.g. a TTS
+    cache key, or a recording's archive version). Entries are evicted
+    least-recently-used once max_memory is exceeded.
+    """
+
+    def __init__(self, max_memory=STRETCH_CACHE_MAX_MEMORY):
+        self.max_memory = max_memory
+        self._memory = OrderedDict()  # (source, factor) -> (data, samplerate)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, source, entry, factor):
+        """Return entry (data, samplerate) of source played factor times as fast."""
+        if factor == 1:
+            return entry
+        key = (source, factor)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        start = LATENCY.now()
+        data, samplerate = entry
+        stretched = time_stretch(data, samplerate, factor), samplerate
+        LATENCY.since("time stretch", start)
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= old[0].nbytes
+            self._memory[key] = stretched
+            self._memory_bytes += stretched[0].nbytes
+            while self._memory_bytes > self.max_memory and len(self._memory) > 1:
+                _, (evicted, _) = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.nbytes
+        return stretched
+
+
+def speed_factor(speed):
+    """Return the time-stretch factor for a Speed setting, rounded to SPEED_STEP."""
+    return round(round(speed / SPEED_STEP) * SPEED_STEP / TTS_RENDER_RATE, 4)
+
+
+def to_int16(data):
+    """Convert float audio in [-1, 1] to int16 PCM."""
+    if data.dtype == np.int16:
+        return data
+    return (np.clip(data, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def peak_envelope(data, bins=WAVEFORM_BINS):
+    """Return (mins, maxs) of data over bins equal slices."""
+    if data.ndim > 1:
+        data = data.mean(axis=1)
+    if len(data) == 0:
+        return np.zeros(bins, dtype=np.float32), np.zeros(bins, dtype=np.float32)
+    starts = np.minimum(np.arange(bins) * len(data) // bins, len(data) - 1)
+    return np.minimum.reduceat(data, starts), np.maximum.reduceat(data, starts)
+
+
+def recording_info(data, samplerate):
+    """Return the duration, levels and waveform peaks of mono audio, for labels and thumbnails."""
+    if data.dtype == np.int16:
+        data = data * np.float32(1.0 / 32768)
+    mins, maxs = peak_envelope(data)
+    return {
+        "duration": len(data) / samplerate,
+        "peak": round(float(np.max(np.abs(data))), 4) if len(data) else 0.0,
+        "rms": round(float(np.sqrt(np.mean(np.square(data, dtype=np.float64)))), 4) if len(data) else 0.0,
+        "min": [round(float(v), 3) for v in mins],
+        "max": [round(float(v), 3) for v in maxs],
+    }
+
+
+class RecordingArchive:
+    """A bank's processed recordings as int16 PCM in one memory-mapped file.
+
+    Takes are appended to a single data file and found through a small
+    JSON index that also keeps each recording's length, levels and
+    waveform peaks. get() returns a slice of the file's memory mapping,
+    so playing a recording neither decodes nor copies it. A replaced take
+    leaves dead space; once there is more dead than live audio the live
+    recordings are rewritten into a new data file. WAV recordings from
+    earlier versions are moved in by migrate().
+    """
+
+    INDEX_NAME = "recordings.json"
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.index_path = self.directory / self.INDEX_NAME
+        self._slots = None  # key -> index entry, read on first use
+        self._file = None  # current data file name, "recordings.<generation>.pcm"
+        self._generation = 0
+        self._next_version = 1
+        self._map = None
+        self._lock = threading.RLock()
+
+    def _load(self):
+        if self._slots is not None:
+            return
+        self._slots = {}
+        if self.index_path.exists():
+            try:
+                index = json.loads(self.index_path.read_text(encoding="utf-8"))
+                self._slots = index["slots"]
+                self._file = index["file"]
+                self._generation = index["generation"]
+                self._next_version = index["next_version"]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error loading recording archive: {e}")
+        # Data files left behind by a compaction whose old file was still open
+        for path in self.directory.glob("recordings.*.pcm"):
+            if path.name != self._file:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def _save_index(self):
+        index = {"file": self._file, "generation": self._generation,
+                 "next_version": self._next_version, "slots": self._slots}
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+
+    def _mapping(self):
+        if self._map is None:
+            path = self.directory / self._file
+            if path.stat().st_size < 2:  # only empty takes so far; mmap cannot map an empty file
+                self._map = np.zeros(0, dtype=np.int16)
+            else:
+                self._map = np.memmap(path, dtype=np.int16, mode="r")
+        return self._map
+
+    def __contains__(self, key):
+        with self._lock:
+            self._load()
+            return key in self._slots
+
+    def keys(self):
+        with self._lock:
+            self._load()
+            return sorted(self._slots)
+
+    def entry(self, key):
+        """Return the index entry (offset, frames, samplerate, version and info) or None."""
+        with self._lock:
+            self._load()
+            return self._slots.get(key)
+
+    def get(self, key):
+        """Return (int16 data mapped from disk, samplerate), or None if key has no recording."""
+        with self._lock:
+            self._load()
+            entry = self._slots.get(key)
+            if entry is None:
+                return None
+            start = entry["offset"]
+            return self._mapping()[start:start + entry["frames"]], entry["samplerate"]
+
+    def put(self, key, data, samplerate):
+        """Store mono audio (float or int16) as key's recording, replacing any earlier one."""
+        data = to_int16(data)
+        with self._lock:
+            self._load()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if self._file is None:
+                self._file = f"recordings.{self._generation}.pcm"
+            with open(self.directory / self._file, "ab") as f:
+                offset = f.tell() // 2
+                f.write(data.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            entry = recording_info(data, samplerate)
+            entry.update(offset=offset, frames=len(data), samplerate=samplerate,
+                         version=self._next_version)
+            self._next_version += 1
+            self._slots[key] = entry
+            self._map = None  # remap to include the new data
+            self._save_index()
+            self._compact_if_needed()
+
+    def _compact_if_needed(self):
+        path = self.directory / self._file
+        live = sum(entry["frames"] for entry in self._slots.values())
+        dead = path.stat().st_size // 2 - live if path.exists() else 0
+        if dead <= max(live, ARCHIVE_SLACK_FRAMES):
+            return
+        old_map, old_path = self._mapping(), path
+        self._generation += 1
+        self._file = f"recordings.{self._generation}.pcm"
+        offset = 0
+        with open(self.directory / self._file, "wb") as f:
+            for entry in self._slots.values():
+                f.write(old_map[entry["offset"]:entry["offset"] + entry["frames"]].tobytes())
+                entry["offset"] = offset
+                offset += entry["frames"]
+            f.flush()
+            os.fsync(f.fileno())
+        self._map = None
+        self._save_index()
+        del old_map
+        try:
+            old_path.unlink()
+        except OSError:
+            pass  # still mapped by a playing message (Windows); removed by the next _load()
+
+    def warm(self):
+        """Touch every page of the mapping so the first play does not wait for the disk."""
+        with self._lock:
+            self._load()
+            if self._file is None or not (self.directory / self._file).exists():
+                return
+            mapping = self._mapping()
+        int(mapping[::2048].sum(dtype=np.int64))
+
+    def migrate(self):
+        """Move WAV recordings of earlier versions into the archive; return how many moved.
+
+        A WAV is kept as the slot's raw take if there is none yet, so
+        processing can still be re-run; otherwise it is deleted.
+        """
+        moved = 0
+        for path in sorted(self.directory.glob("F*.wav")):
+            key = path.stem
+            try:
+                if key not in self:
+                    data, samplerate = sf.read(str(path), dtype="int16")
+                    if data.ndim > 1:
+                        data = data.mean(axis=1).astype(np.int16)
+                    self.put(key, data, samplerate)
+                raw_path = self.directory / "raw" / path.name
+                if raw_path.exists():
+                    path.unlink()
+                else:
+                    raw_path.parent.mkdir(exist_ok=True)
+                    os.replace(path, raw_path)
+                moved += 1
+            except Exception as e:
+                print(f"Error migrating recording {path.name}: {e}")
+        return moved
+
+
+def clip_sequence(text):
+    """Return the clip names that say text.
+
+    Clip words ("ZONE", "ALFA", "FIVE NINE", "59") are used as they are;
+    anything else is spelled out with digits and the phonetic alphabet.
+    """
+    tokens = re.findall(r"[A-Z0-9]+(?:-[A-Z]+)?|/", text.upper())
+    names = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token == "FIVE" and tokens[i + 1:i + 2] == ["NINE"]:
+            names.append("FIVE NINE")
+            i += 2
+            continue
+        token = CLIP_ALIASES.get(token, token)
+        if token in CLIP_WORDS:
+            names.append(token)
+        else:
+            for char in token.replace("-", ""):
+                names.append(char if char.isdigit() else NATO_ALPHABET[ord(char) - ord("A")])
+        i += 1
+    return names
+
+
+def assemble_clips(clips, crossfade):
+    """Join clips whose edges are already faded, overlapping each pair by crossfade frames."""
+    lengths = np.array([len(clip) for clip in clips], dtype=np.int64)
+    overlaps = np.minimum(crossfade, np.minimum(lengths[:-1], lengths[1:]))
+    starts = np.concatenate(([0], np.cumsum(lengths[:-1] - overlaps)))
+    out = np.zeros(int(starts[-1] + lengths[-1]), dtype=np.float32)
+    for start, clip in zip(starts.tolist(), clips):
+        out[start:start + len(clip)] += clip
+    return out
+
+
+class ClipBank:
+    """Recorded words (digits, phonetics, "five nine", ...) for building messages at key time.
+
+    Clips live in their own RecordingArchive and are kept in memory at the
+    playback rate, cut tight and with sine fades on both ends, so joining
+    them is a single overlap-add.
+    """
+
+    def __init__(self, directory=CLIPS_DIR, samplerate=None, stretch_cache=None):
+        self.archive = RecordingArchive(directory)
+        self.samplerate = samplerate
+        self.stretch_cache = stretch_cache  # StretchCache for assemble() at other speeds
+        self._clips = {}  # name -> (archive version, prepared float32 data)
+        self._lock = threading.Lock()
+
+    @property
+    def crossfade_frames(self):
+        return int(CLIP_CROSSFADE * (self.samplerate or 44100))
+
+    def prepare(self, name):
+        """Return a clip ready for assemble_clips(), or None if it is not recorded."""
+        entry = self.archive.entry(name)
+        if entry is None:
+            return None
+        with self._lock:
+            cached = self._clips.get(name)
+        if cached is not None and cached[0] == entry["version"]:
+            return cached[1]
+        data, samplerate = self.archive.get(name)
+        rate = self.samplerate or samplerate
+        data = trim_silence_edges(convert_rate(data * np.float32(1.0 / 32768), samplerate, rate),
+                                  CLIP_TRIM_LEVEL)
+        n = min(self.crossfade_frames, len(data) // 2)
+        if n:
+            ramp = np.sin(np.linspace(0, np.pi / 2, n, dtype=np.float32))
+            data[:n] *= ramp
+            data[-n:] *= ramp[::-1]
+        with self._lock:
+            self._clips[name] = (entry["version"], data)
+        return data
+
+    def load(self):
+        for name in self.archive.keys():
+            try:
+                self.prepare(name)
+            except Exception as e:
+                print(f"Error loading clip {name}: {e}")
+
+    def missing(self, names):
+        """Return the names (in order, once each) that have no recorded clip."""
+        return [name for name in dict.fromkeys(names) if name not in self.archive]
+
+    def stretched(self, name, factor):
+        """Return a prepared clip played factor times as fast, or None if it is not recorded."""
+        clip = self.prepare(name)
+        if clip is None or factor == 1 or self.stretch_cache is None:
+            return clip
+        source = ("clip", str(self.archive.directory), name, self.archive.entry(name)["version"])
+        return self.stretch_cache.get(source, (clip, self.samplerate), factor)[0]
+
+    def assemble(self, names, factor=1):
+        """Return (data, samplerate) saying the clips in order, or None if one is missing."""
+        clips = [self.stretched(name, factor) for name in names]
+        if not clips or any(clip is None for clip in clips):
+            return None
+        return assemble_clips(clips, self.crossfade_frames), self.samplerate
+
+
+class RecordingBank:
+    """Recordings ready for the output stream.
+
+    A recording made at the playback rate is played straight from its
+    bank's archive mapping. Any other is converted once per rate it is
+    asked for and the int16 result kept in memory, until the slot is
+    recorded again.
+    """
+
+    def __init__(self, samplerate=None):
+        self.samplerate = samplerate  # rate get() converts to; None = as recorded
+        self._converted = {}  # (directory, key) -> (archive version, {samplerate: data})
+        self._lock = threading.Lock()
+
+    def get(self, archive, key, samplerate=None):
+        """Return (data, samplerate) for a slot's recording, or None if it has none."""
+        entry = archive.entry(key)
+        found = archive.get(key)
+        if entry is None or found is None:
+            return None
+        data, file_rate = found
+        rate = samplerate or self.samplerate or file_rate
+        if rate == file_rate:
+            return data, rate
+        cache_key = (archive.directory, key)
+        with self._lock:
+            cached = self._converted.get(cache_key)
+        if cached is None or cached[0] != entry["version"]:
+            cached = (entry["version"], {})
+            with self._lock:
+                self._converted[cache_key] = cached
+        versions = cached[1]
+        if rate not in versions:
+            start = LATENCY.now()
+            versions[rate] = to_int16(convert_rate(data, file_rate, rate))
+            LATENCY.since("recording resample", start)
+        return versions[rate], rate
+
+    def load_all(self, archive):
+        """Migrate old WAV files, then make every recording in archive ready to play."""
+        start = LATENCY.now()
+        archive.migrate()
+        for key in archive.keys():
+            try:
+                self.get(archive, key)
+            except Exception as e:
+                print(f"Error loading recording {key}: {e}")
+        archive.warm()
+        LATENCY.since("recording load", start)
+
+
+# Post-processing applied to a take when it is saved; per-slot overrides live in the config
+DEFAULT_PROCESSING = {
+    "highpass": True,    # remove DC and rumble below ~80 Hz
+    "trim": True,        # cut leading/trailing dead air
+    "compress": False,   # even out loud and quiet syllables
+    "normalize": "peak",  # "peak", "rms" or "off"
+}
+NORMALIZE_MODES = ("peak", "rms", "off")
+PROCESS_BLOCK = 1 << 16  # frames per block in the level steps, so their memory does not grow with the take
+
+
+def _moving_average(x, n):
+    """Centered moving average of x over n samples, same length as x."""
+    if n <= 1 or len(x) < n:
+        return x
+    c = np.cumsum(np.concatenate(([0.0], x)))
+    avg = (c[n:] - c[:-n]) / n
+    return np.pad(avg, (n // 2, n - 1 - n // 2), mode="edge")
+
+
+@lru_cache(maxsize=8)
+def _highpass_kernel(samplerate, cutoff):
+    """Linear-phase FIR with a gain ramp from 0 at cutoff/2 to 1 at cutoff, and no DC."""
+    n_taps = int(8 * samplerate / cutoff) | 1  # odd, about cutoff/8 Hz resolution
+    freqs = np.fft.rfftfreq(n_taps, 1.0 / samplerate)
+    response = np.clip((freqs - cutoff / 2) / (cutoff / 2), 0.0, 1.0)
+    taps = np.roll(np.fft.irfft(response, n=n_taps), n_taps // 2) * np.hanning(n_taps)
+    return taps - taps.mean()
+
+
+def highpass(data, samplerate, cutoff=80.0):
+    """Remove DC and content below cutoff Hz, filtering in blocks (overlap-add) so memory stays bounded."""
+    if len(data) == 0:
+        return data
+    taps = _highpass_kernel(samplerate, cutoff)
+    n_taps = len(taps)
+    fft_size = 1 << (4 * n_taps).bit_length()
+    step = fft_size - n_taps + 1
+    kernel = np.fft.rfft(taps, fft_size)
+    offset = data.mean(dtype=np.float64)  # removed up front so the edges of the take have no DC step
+    out = np.zeros(len(data) + n_taps - 1, dtype=np.float32)
+    for start in range(0, len(data), step):
+        chunk = data[start:start + step] - offset
+        filtered = np.fft.irfft(np.fft.rfft(chunk, fft_size) * kernel, fft_size)
+        out[start:start + len(chunk) + n_taps - 1] += filtered[:len(chunk) + n_taps - 1]
+    delay = n_taps // 2
+    return out[delay:delay + len(data)]
+
+
+def trim_silence(data, samplerate, threshold_db=-45.0, pad=0.1):
+    """Cut leading and trailing audio whose 10 ms RMS is below threshold_db."""
+    frame = max(1, int(0.01 * samplerate))
+    n_frames = len(data) // frame
+    if n_frames == 0:
+        return data
+    rms = np.empty(n_frames)
+    step = max(1, PROCESS_BLOCK // frame)
+    for i in range(0, n_frames, step):
+        frames = data[i * frame:min(n_frames, i + step) * frame].reshape(-1, frame)
+        rms[i:i + len(frames)] = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+    loud = np.flatnonzero(rms > 10 ** (threshold_db / 20))
+    if len(loud) == 0:
+        return data
+    pad_frames = int(pad * samplerate)
+    start = max(0, loud[0] * frame - pad_frames)
+    end = min(len(data), (loud[-1] + 1) * frame + pad_frames)
+    return data[start:end]
+
+
+def compress(data, samplerate, threshold_db=-20.0, ratio=3.0, window=0.01):
+    """Reduce level above threshold_db by ratio using a smoothed RMS envelope, block by block."""
+    n = max(1, int(window * samplerate))
+    threshold = 10 ** (threshold_db / 20)
+    out = np.empty(len(data), dtype=np.float32)
+    for start in range(0, len(data), PROCESS_BLOCK):
+        end = min(len(data), start + PROCESS_BLOCK)
+        # n frames of context on each side keep both centered averages exact inside the block
+        lo, hi = max(0, start - n), min(len(data), end + n)
+        chunk = data[lo:hi].astype(np.float64)
+        envelope = np.sqrt(_moving_average(chunk ** 2, n)) + 1e-9
+        gain = np.minimum(1.0, (threshold / envelope) ** (1.0 - 1.0 / ratio))
+        out[start:end] = (chunk * _moving_average(gain, n))[start - lo:end - lo]
+    return out
+
+
+def normalize(data, mode="peak", peak_db=-1.0, rms_db=-18.0):
+    """Scale to a peak or RMS target; RMS gain is limited so the peak stays below peak_db."""
+    peak = max(data.max(), -data.min()) if len(data) else 0.0
+    if mode == "off" or peak == 0:
+        return data
+    peak_limit = 10 ** (peak_db / 20)
+    if mode == "rms":
+        total = 0.0
+        for start in range(0, len(data), PROCESS_BLOCK):
+            block = data[start:start + PROCESS_BLOCK].astype(np.float64)
+            total += np.dot(block, block)
+        rms = np.sqrt(total / len(data))
+        gain = min(10 ** (rms_db / 20) / rms, peak_limit / peak)
+    else:
+        gain = peak_limit / peak
+    return (data * np.float32(gain)).astype(np.float32, copy=False)
+
+
+def process_audio(data, samplerate, options=None):
+    """Run the post-processing steps enabled in options over mono float data."""
+    options = dict(DEFAULT_PROCESSING, **(options or {}))
+    if data.ndim > 1:
+        data = data.mean(axis=1)
+    data = data.astype(np.float32)
+    if options["highpass"]:
+        data = highpass(data, samplerate)
+    else:
+        data = data - np.mean(data) if len(data) else data
+    if options["trim"]:
+        data = trim_silence(data, samplerate)
+    if options["compress"]:
+        data = compress(data, samplerate)
+    return normalize(data, options["normalize"])
+
+
+def process_recording(raw_path, archive, key, options=None):
+    """Process a raw take into a slot's playable recording; return its duration in seconds."""
+    data, samplerate = sf.read(str(raw_path), dtype="float32")
+    data = process_audio(data, samplerate, options)
+    archive.put(key, data, samplerate)
+    return len(data) / samplerate
+
+
+def save_raw_take(archive, key, raw_path):
+    """Write a slot's archived recording out as its raw take, if it has none yet."""
+    found = archive.get(key)
+    if found is None or Path(raw_path).exists():
+        return
+    Path(raw_path).parent.mkdir(parents=True, exist_ok=True)
+    sf.write(str(raw_path), found[0], found[1], format="WAV", subtype="PCM_16")
 
-class VoiceKeyerTTS:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Voice Keyer - Text-to-Speech")
-        self.root.geometry("800x650")
-        self.root.minsize(700, 550)
 
-        # Find preferred voice ID on startup
-        self.preferred_voice_id = self._find_female_voice_id()
+def process_all_recordings(archive, options_for=None):
+    """Re-run post-processing over every recording in archive.
+
+    Recordings without a raw take (made before processing existed) have
+    their current audio saved to the raw folder first, so nothing is lost.
+    options_for(key) returns the options for a slot. Returns the processed keys.
+    """
+    archive.migrate()
+    raw_dir = archive.directory / "raw"
+    for key in archive.keys():
+        save_raw_take(archive, key, raw_dir / f"{key}.wav")
+    processed = []
+    for raw_path in sorted(raw_dir.glob("*.wav")):
+        key = raw_path.stem
+        try:
+            process_recording(raw_path, archive, key, options_for(key) if options_for else None)
+            processed.append(key)
+        except Exception as e:
+            print(f"Error processing {raw_path.name}: {e}")
+    return processed
+
+
+class StreamingRecorder:
+    """Records from the input device straight into a sound file.
+
+    The audio callback only copies each block into a preallocated ring
+    buffer. A writer thread drains the ring into an open SoundFile while
+    recording, so memory stays bounded however long the take is, and
+    stopping only flushes the last few blocks before the temporary file is
+    renamed over the slot's recording.
+
+    For the level meter the callback also stores each block's peak, sum
+    of squares and length in small preallocated arrays (no copies, no
+    locks); read_levels() combines the blocks stored since its last call.
+
+    With a source (an open InputMonitor) no stream is opened: the monitor
+    feeds the callback, starting with the last `preroll` seconds it heard.
+    """
+
+    METER_BLOCKS = 256  # per-block level entries kept for read_levels()
+
+    def __init__(self, path, samplerate=44100, channels=1, max_seconds=RECORDING_MAX_SECONDS,
+                 ring_seconds=2.0, on_limit=None, source=None, preroll=0.0):
+        self.path = Path(path)
+        self.samplerate = samplerate
+        self.channels = channels
+        self.max_frames = int(max_seconds * samplerate)
+        self.on_limit = on_limit  # called from the writer thread when max_seconds is reached
+        self.source = source
+        self.preroll = preroll if source is not None else 0.0
+        self.frames_captured = 0
+        self.overruns = 0
+        self._ring = np.zeros((int((ring_seconds + self.preroll) * samplerate), channels),
+                              dtype=np.float32)
+        self._write_pos = 0  # total frames written into the ring (callback only)
+        self._read_pos = 0   # total frames drained from the ring (writer only)
+        self._tmp_path = self.path.with_name(self.path.name + ".part")
+        self._file = None
+        self._stream = None
+        self._writer = None
+        self._stop_event = threading.Event()
+        self._block_peaks = np.zeros(self.METER_BLOCKS, dtype=np.float32)
+        self._block_sums = np.zeros(self.METER_BLOCKS, dtype=np.float64)
+        self._block_frames = np.zeros(self.METER_BLOCKS, dtype=np.int64)
+        self._blocks_written = 0  # bumped by the callback after an entry is filled
+        self._blocks_read = 0
+        self.clipped = False  # set by read_levels once any block reached CLIP_LEVEL
+
+    def start(self):
+        self._file = sf.SoundFile(str(self._tmp_path), mode="w", samplerate=self.samplerate,
+                                  channels=self.channels, format="WAV", subtype="PCM_16")
+        self._writer = threading.Thread(target=self._write_worker, daemon=True)
+        self._writer.start()
+        if self.source is not None:
+            self.source.attach(self, self.preroll)
+            return
+        self._stream = sd.InputStream(samplerate=self.samplerate, channels=self.channels,
+                                      dtype="float32", callback=self._callback)
+        self._stream.start()
+
+    def _callback(self, indata, frames, time_info, status):
+        n = min(frames, self.max_frames - self.frames_captured)
+        size = len(self._ring)
+        if n <= 0:
+            return
+        block = indata[:n, 0]
+        i = self._blocks_written % self.METER_BLOCKS
+        self._block_peaks[i] = max(block.max(), -block.min())
+        self._block_sums[i] = np.dot(block, block)
+        self._block_frames[i] = n
+        self._blocks_written += 1
+        if self._write_pos + n - self._read_pos > size:
+            self.overruns += 1  # Writer fell behind; drop the block rather than block
+            return
+        start = self._write_pos % size
+        first = min(n, size - start)
+        self._ring[start:start + first] = indata[:first]
+        if first < n:
+            self._ring[:n - first] = indata[first:n]
+        self._write_pos += n
+        self.frames_captured += n
+
+    def _drain(self):
+        size = len(self._ring)
+        available = self._write_pos - self._read_pos
+        if available <= 0:
+            return
+        start = self._read_pos % size
+        first = min(available, size - start)
+        self._file.write(self._ring[start:start + first])
+        if first < available:
+            self._file.write(self._ring[:available - first])
+        self._read_pos += available
+
+    def _write_worker(self):
+        limit_reported = False
+        while not self._stop_event.wait(0.05):
+            self._drain()
+            if not limit_reported and self.frames_captured >= self.max_frames:
+                limit_reported = True
+                if self.on_limit is not None:
+                    self.on_limit()
+        self._drain()
+
+    @property
+    def duration(self):
+        return self.frames_captured / self.samplerate
+
+    def read_levels(self):
+        """Return (peak, rms) of the blocks recorded since the last call, or None."""
+        written = self._blocks_written
+        start = max(self._blocks_read, written - self.METER_BLOCKS)
+        self._blocks_read = written
+        if start >= written:
+            return None
+        index = np.arange(start, written) % self.METER_BLOCKS
+        peak = float(self._block_peaks[index].max())
+        rms = float(np.sqrt(self._block_sums[index].sum() / max(1, self._block_frames[index].sum())))
+        if peak >= CLIP_LEVEL:
+            self.clipped = True
+        return peak, rms
+
+    def stop(self):
+        """Stop recording; return the saved path, or None if nothing was captured."""
+        if self.source is not None:
+            self.source.detach(self)
+        else:
+            self._stream.stop()
+            self._stream.close()
+        self._stop_event.set()
+        self._writer.join()
+        self._file.close()
+        if self.frames_captured == 0:
+            self._tmp_path.unlink()
+            return None
+        os.replace(self._tmp_path, self.path)
+        return self.path
+
+
+class InputRing:
+    """Fixed-size int16 ring holding the latest frames of mono input."""
+
+    def __init__(self, frames):
+        self.data = np.zeros(frames, dtype=np.int16)
+        self.write_pos = 0  # total frames written (writer only)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def write(self, block):
+        size = len(self.data)
+        n = len(block)
+        if n > size:
+            block = block[n - size:]
+            self.write_pos += n - size
+            n = size
+        start = self.write_pos % size
+        first = min(n, size - start)
+        self.data[start:start + first] = block[:first]
+        if first < n:
+            self.data[:n - first] = block[first:]
+        self.write_pos += n
+
+    def segments(self, frames, end=None):
+        """Return views (oldest first, at most two) of the frames before end (default: newest)."""
+        size = len(self.data)
+        end = self.write_pos if end is None else min(end, self.write_pos)
+        frames = max(0, min(frames, size, end, size - (self.write_pos - end)))
+        start = (end - frames) % size
+        first = min(frames, size - start)
+        parts = [self.data[start:start + first]]
+        if first < frames:
+            parts.append(self.data[:frames - first])
+        return parts
+
+    def latest(self, frames, end=None):
+        """Return a copy of the frames before end (default: newest)."""
+        return np.concatenate(self.segments(frames, end))
+
+
+class InputMonitor:
+    """Input stream kept open in the background, with its latest audio in a ring.
+
+    The callback copies each int16 block into an InputRing of fixed size
+    and checks its level against threshold_db; nothing is allocated per
+    block. While a StreamingRecorder is attached, the block is also passed
+    to the recorder's callback as float32 (through a preallocated scratch
+    buffer), after the pre-roll taken from the ring.
+
+    Used for pre-roll and voice activation on the recording input, and,
+    with a ring of several minutes and no threshold, as the receive-audio
+    recorder.
+    """
+
+    def __init__(self, samplerate, seconds=PREROLL_MAX_SECONDS, blocksize=INPUT_BLOCKSIZE,
+                 threshold_db=VAD_THRESHOLD_DB, device=None):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.device = device
+        self.ring = InputRing(int(seconds * samplerate))
+        self.voice_pos = 0  # ring position after the last block above the threshold
+        self.busy = 0.0  # seconds spent in the callback, for cpu_load
+        self._threshold = None if threshold_db is None else 10 ** (threshold_db / 10)  # mean square
+        self._scratch = np.zeros((blocksize, 1), dtype=np.float32)
+        self._pending = None  # (recorder, pre-roll frames) to attach at the next block
+        self._recorder = None
+        self._stream = None
+
+    @property
+    def memory_bytes(self):
+        return self.ring.nbytes + self._scratch.nbytes
+
+    @property
+    def cpu_load(self):
+        """Fraction of real time spent in the callback so far."""
+        return self.busy * self.samplerate / max(1, self.ring.write_pos)
+
+    @property
+    def silence(self):
+        """Seconds since the last block above the voice threshold."""
+        return (self.ring.write_pos - self.voice_pos) / self.samplerate
+
+    def start(self):
+        self._stream = sd.InputStream(device=self.device, samplerate=self.samplerate, channels=1,
+                                      dtype="int16", blocksize=self.blocksize,
+                                      callback=self._callback)
+        self._stream.start()
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+    def attach(self, recorder, preroll=0.0):
+        """Feed recorder from the next block on, starting preroll seconds back."""
+        self._pending = (recorder, int(preroll * self.samplerate))
+
+    def detach(self, recorder):
+        """Stop feeding recorder; a block being handed over at that moment is dropped."""
+        if self._pending is not None and self._pending[0] is recorder:
+            self._pending = None
+        if self._recorder is recorder:
+            self._recorder = None
+
+    def _feed(self, block, recorder, time_info, status):
+        """Pass int16 block to recorder as float32; return True if any part was voiced."""
+        voiced = False
+        step = len(self._scratch)
+        for i in range(0, len(block), step):
+            part = block[i:i + step]
+            chunk = self._scratch[:len(part)]
+            chunk[:, 0] = part
+            chunk *= np.float32(1.0 / 32768)
+            if (self._threshold is not None
+                    and np.dot(chunk[:, 0], chunk[:, 0]) >= self._threshold * len(part)):
+                voiced = True
+            if recorder is not None:
+                recorder._callback(chunk, len(part), time_info, status)
+        return voiced
+
+    def _callback(self, indata, frames, time_info, status):
+        start = time.perf_counter()
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            recorder, preroll = pending
+            for part in self.ring.segments(preroll):
+                self._feed(part, recorder, time_info, status)
+            self._recorder = recorder
+        block = indata[:frames, 0]
+        self.ring.write(block)
+        if self._threshold is not None or self._recorder is not None:
+            if self._feed(block, self._recorder, time_info, status):
+                self.voice_pos = self.ring.write_pos
+        self.busy += time.perf_counter() - start
+
+
+class _PlaybackItem:
+    __slots__ = ("tag", "data", "pos", "plays_left", "gap_frames", "queued", "requested_at")
+
+    def __init__(self, tag, data, count=1, gap_frames=0, delay_frames=0, queued=False,
+                 requested_at=None):
+        self.tag = tag
+        self.data = data
+        self.pos = -delay_frames  # position within one cycle of data + gap; < 0 = silence first
+        self.plays_left = count  # None repeats until stopped
+        self.gap_frames = gap_frames
+        self.queued = queued  # True: wait for the current message instead of pre-empting it
+        self.requested_at = requested_at  # perf_counter time of the key press, for LATENCY
+
+
+class PlaybackEngine:
+    """Plays audio buffers through one long-lived output stream.
+
+    The stream callback pulls play/stop commands from a queue, so a new
+    message pre-empts the current one and a stop takes effect within one
+    audio block, without opening a stream or starting a thread per play.
+    Messages passed to enqueue() wait for the current one and start in the
+    same block it ends in, so chained messages are joined sample-accurately.
+    Finished messages are reported to on_finished(tag, completed), and
+    queued messages to on_started(tag) as they start, from a single
+    notifier thread, never from the audio callback itself.
+
+    With a PTT attached (set_ptt) the transmitter is keyed lead seconds
+    before the first sample reaches the DAC and released tail seconds
+    after the last one, and during repeat gaps long enough to allow it.
+    Both are scheduled in stream samples, using the callback's time info
+    for the output latency; a release may come up to one block late.
+    """
+
+    IDLE = "idle"
+    PLAYING = "playing"
+    STOPPING = "stopping"
+
+    def __init__(self, samplerate=44100, blocksize=512, on_finished=None, stream_factory=None,
+                 on_started=None, device=None):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.device = device  # output device; None = the default
+        self.on_finished = on_finished
+        self.on_started = on_started
+        self.stream_factory = stream_factory  # replaces sd.OutputStream, e.g. FakeOutputStream
+        self.state = self.IDLE
+        self._commands = deque()  # _PlaybackItem to play, or None to stop
+        self._current = None
+        self._queue = deque()  # queued items waiting for the current one (callback only)
+        self._events = queue.SimpleQueue()
+        self._stream = None
+        self._lock = threading.Lock()
+        self._frames = 0  # stream index of the next sample written
+        self.ptt = None
+        self.ptt_lead_frames = 0
+        self.ptt_tail_frames = 0
+        self._ptt_on_at = None  # stream indices at which the DAC position keys / releases
+        self._ptt_off_at = None
+        self._hold_until = 0  # no audio before this index while the lead runs
+        threading.Thread(target=self._notify_worker, daemon=True).start()
+
+    def set_ptt(self, ptt, lead=0.0, tail=0.0):
+        """Key ptt (or None for no PTT) around each message."""
+        old = self.ptt
+        self.ptt_lead_frames = int(round(lead * self.samplerate))
+        self.ptt_tail_frames = int(round(tail * self.samplerate))
+        self._ptt_on_at = self._ptt_off_at = None
+        self.ptt = ptt
+        if old is not None and old is not ptt:
+            old.close()
+
+    def _ensure_stream(self):
+        with self._lock:
+            if self._stream is None:
+                factory = self.stream_factory or sd.OutputStream
+                options = {} if self.device is None else {"device": self.device}
+                self._stream = factory(
+                    samplerate=self.samplerate, channels=1, dtype="float32",
+                    blocksize=self.blocksize, callback=self._callback, **options)
+                self._stream.start()
+
+    def _prepare(self, data, samplerate):
+        """Return a mono buffer at the stream rate (float32 or int16)."""
+        if data.ndim > 1 or samplerate != self.samplerate:
+            data = convert_rate(data, samplerate, self.samplerate)
+        return data
+
+    def play(self, data, samplerate, tag=None, count=1, gap=0.0, requested_at=None):
+        """Start playing data, pre-empting whatever is playing now.
+
+        With count > 1 (or None for no limit) the message repeats with gap
+        seconds of silence after each play. Repeats are counted in samples of
+        the output stream, so the cycle never drifts against the audio clock.
+        With requested_at (a time.perf_counter() value) the delay until the
+        first sample reaches the DAC is recorded in LATENCY.
+        """
+        item = _PlaybackItem(tag, self._prepare(data, samplerate), count,
+                             int(round(gap * self.samplerate)), requested_at=requested_at)
+        self._ensure_stream()
+        # Queue first: a callback running in between would otherwise mark the engine idle
+        self._commands.append(item)
+        self.state = self.PLAYING
+
+    def enqueue(self, data, samplerate, tag=None, delay=0.0, requested_at=None):
+        """Play data once the current message and those queued before it have ended.
+
+        It starts delay seconds after the previous message's last sample
+        (0 = gapless), or at once if nothing is playing. play() and stop()
+        drop the queue.
+        """
+        item = _PlaybackItem(tag, self._prepare(data, samplerate),
+                             delay_frames=int(round(delay * self.samplerate)), queued=True,
+                             requested_at=requested_at)
+        self._ensure_stream()
+        # Queue first: a callback running in between would otherwise mark the engine idle
+        self._commands.append(item)
+        self.state = self.PLAYING
+
+    def stop(self):
+        """Stop playback at the next audio block."""
+        if self.state != self.IDLE or self._commands:
+            self.state = self.STOPPING
+            self._commands.append(None)
+
+    def close(self):
+        with self._lock:
+            if self._stream is not None:
+                self._stream.stop()
+                self._stream.close()
+                self._stream = None
+        self.state = self.IDLE
+        if self.ptt is not None:
+            self.ptt.close()
+            self.ptt = None
+
+    def _latency_frames(self, time_info):
+        """Frames between the sample now at the DAC and the start of this block."""
+        try:
+            latency = time_info.outputBufferDacTime - time_info.currentTime
+        except AttributeError:
+            return 0
+        if time_info.currentTime <= 0 or not 0 < latency < 1.0:
+            return 0  # host API without usable timestamps
+        return int(latency * self.samplerate)
+
+    def _callback(self, outdata, frames, time_info, status):
+        ptt = self.ptt
+        while self._commands:
+            command = self._commands.popleft()
+            if command is not None:
+                self.state = self.PLAYING
+            if command is not None and command.queued:
+                if self._current is None:
+                    command.pos = 0  # nothing to follow: no delay
+                    self._current = command
+                    self._events.put(("started", command.tag))
+                else:
+                    self._queue.append(command)
+                continue
+            while self._queue:
+                self._events.put(("finished", self._queue.popleft().tag, False))
+            if self._current is not None:
+                self._events.put(("finished", self._current.tag, False))
+                if ptt is not None and ptt.keyed:
+                    self._ptt_off_at = self._frames + self.ptt_tail_frames
+                self._ptt_on_at = None
+            self._current = command
+
+        dac_index = self._frames - self._latency_frames(time_info)
+        if ptt is not None:
+            if self._ptt_off_at is not None and dac_index >= self._ptt_off_at:
+                ptt.set(False)
+                self._ptt_off_at = None
+            if self._ptt_on_at is not None and dac_index + frames >= self._ptt_on_at:
+                ptt.set(True)  # up to one block early, so the lead is never short
+                self._ptt_on_at = None
+
+        out = outdata[:, 0]
+        filled = 0
+        item = self._current
+        while item is not None and filled < frames:
+            length = len(item.data)
+            if item.pos < 0:
+                # Fixed gap before a queued message
+                n = min(frames - filled, -item.pos)
+                out[filled:filled + n] = 0
+                item.pos += n
+                filled += n
+                continue
+            if item.pos == 0 and ptt is not None:
+                # Start of a play: key now if needed and hold the audio for the lead
+                if not ptt.keyed:
+                    ptt.set(True)
+                    self._hold_until = dac_index + self.ptt_lead_frames
+                self._ptt_on_at = self._ptt_off_at = None
+                start = self._frames + filled
+                if start < self._hold_until:
+                    n = min(frames - filled, self._hold_until - start)
+                    out[filled:filled + n] = 0
+                    filled += n
+                    continue
+            if item.pos < length:
+                if item.requested_at is not None:
+                    # Estimated time this sample reaches the DAC; recorded off the audio thread
+                    dac_time = time.perf_counter() + (self._latency_frames(time_info) + filled) / self.samplerate
+                    self._events.put(("latency", "key to audio", dac_time - item.requested_at))
+                    item.requested_at = None
+                n = min(frames - filled, length - item.pos)
+                chunk = item.data[item.pos:item.pos + n]
+                if chunk.dtype == np.int16:
+                    np.multiply(chunk, 1.0 / 32768, out=out[filled:filled + n], casting="unsafe")
+                else:
+                    out[filled:filled + n] = chunk
+            else:
+                # Silent gap before the next repeat
+                n = min(frames - filled, length + item.gap_frames - item.pos)
+                out[filled:filled + n] = 0
+            ended = item.pos < length <= item.pos + n
+            item.pos += n
+            filled += n
+
+            last_play = item.plays_left is not None and item.plays_left <= 1
+            if ended and ptt is not None:
+                end = self._frames + filled
+                self._ptt_off_at = end + self.ptt_tail_frames
+                if not last_play:
+                    self._ptt_on_at = end + item.gap_frames - self.ptt_lead_frames
+                    if self._ptt_on_at <= self._ptt_off_at:
+                        # Gap too short to drop PTT: stay keyed through it
+                        self._ptt_on_at = self._ptt_off_at = None
+            if item.pos >= length and last_play:
+                self._events.put(("finished", item.tag, True))
+                self._current = item = self._queue.popleft() if self._queue else None
+                if item is not None:
+                    self._events.put(("started", item.tag))
+            elif item.pos >= length + item.gap_frames:
+                item.pos = 0
+                if item.plays_left is not None:
+                    item.plays_left -= 1
+        out[filled:] = 0
+        self._frames += frames
+
+        if self._current is None and not self._commands:
+            self.state = self.IDLE
+
+    def _notify_worker(self):
+        while True:
+            event = self._events.get()
+            if event[0] == "latency":
+                LATENCY.add(event[1], event[2])
+                continue
+            callback = self.on_started if event[0] == "started" else self.on_finished
+            if callback is not None:
+                try:
+                    callback(*event[1:])
+                except Exception as e:
+                    print(f"Error in playback callback: {e}")
+
+
+class _FakeTimeInfo:
+    __slots__ = ("currentTime", "outputBufferDacTime")
+
+
+class FakeOutputStream:
+    """Stand-in for sd.OutputStream that pulls audio on a timer thread.
+
+    Used for --fake-audio and for testing without a sound card: the
+    callback runs at the real block rate and the output is discarded.
+    Stream times are time.perf_counter() values with a fixed latency;
+    first_sound/last_sound are the DAC times of the first and last
+    non-silent samples played (reset them to None to measure again).
+    """
+
+    def __init__(self, samplerate, channels, dtype, blocksize, callback, latency=0.0):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.dtype = dtype
+        self.blocksize = blocksize
+        self.callback = callback
+        self.latency = latency
+        self.frames_played = 0
+        self.first_sound = None
+        self.last_sound = None
+        self.active = False
+        self._thread = None
+
+    def start(self):
+        self.active = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        out = np.zeros((self.blocksize, self.channels), dtype=self.dtype)
+        time_info = _FakeTimeInfo()
+        period = self.blocksize / self.samplerate
+        next_time = time.perf_counter()
+        while self.active:
+            time_info.currentTime = time.perf_counter()
+            time_info.outputBufferDacTime = time_info.currentTime + self.latency
+            self.callback(out, self.blocksize, time_info, None)
+            sound = np.flatnonzero(out[:, 0])
+            if len(sound):
+                if self.first_sound is None:
+                    self.first_sound = time_info.outputBufferDacTime + sound[0] / self.samplerate
+                self.last_sound = time_info.outputBufferDacTime + (sound[-1] + 1) / self.samplerate
+            self.frames_played += self.blocksize
+            next_time += period
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def stop(self):
+        self.active = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def close(self):
+        self.stop()
+
+
+class SerialPTT:
+    """Keys the transmitter with the RTS or DTR line of a serial port (needs pyserial).
+
+    set() is called from the audio callback: it is one modem-control
+    call and never raises.
+    """
+
+    LINES = ("RTS", "DTR")
+
+    def __init__(self, port, line="RTS"):
+        import serial
+        self.line = line.upper()
+        if self.line not in self.LINES:
+            raise ValueError(f"Unknown PTT line: {line}")
+        self.keyed = False
+        self._serial = serial.Serial()
+        self._serial.port = port
+        # Both lines are applied when the port opens, so it never keys by accident
+        self._serial.rts = False
+        self._serial.dtr = False
+        self._serial.open()
+
+    def set(self, keyed):
+        if keyed == self.keyed:
+            return
+        self.keyed = keyed
+        try:
+            if self.line == "RTS":
+                self._serial.rts = keyed
+            else:
+                self._serial.dtr = keyed
+        except Exception as e:
+            print(f"Error switching PTT: {e}")
+
+    def close(self):
+        self.set(False)
+        self._serial.close()
+
+
+class _PtyPTT:
+    """PTT stand-in for --ptt-test: writes b"1"/b"0" to a pseudo-terminal on each change.
+
+    (Pseudo-terminals have no RTS/DTR lines to watch.)
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.keyed = False
+
+    def set(self, keyed):
+        if keyed != self.keyed:
+            self.keyed = keyed
+            os.write(self.fd, b"1" if keyed else b"0")
+
+    def close(self):
+        self.set(False)
+
+
+def ptt_timing_test(lead=0.15, tail=0.1, latency=0.02, runs=3):
+    """Key a pseudo-terminal around a test tone played to FakeOutputStream.
+
+    Prints the measured lead (PTT on to first sample at the DAC) and tail
+    (last sample to PTT off) of each run. Returns True if none is short
+    and none is more than one audio block (plus 5 ms) long.
+    """
+    master, slave = os.openpty()
+    changes = []  # (perf_counter time, b"1" or b"0") as read from the pty
+
+    def reader():
+        while True:
+            try:
+                data = os.read(master, 64)
+            except OSError:
+                return
+            if not data:
+                return
+            now = time.perf_counter()
+            changes.extend((now, data[i:i + 1]) for i in range(len(data)))
+
+    threading.Thread(target=reader, daemon=True).start()
+    streams = []
+
+    def factory(**kwargs):
+        streams.append(FakeOutputStream(latency=latency, **kwargs))
+        return streams[-1]
+
+    done = threading.Event()
+    engine = PlaybackEngine(on_finished=lambda tag, completed: done.set(), stream_factory=factory)
+    engine.set_ptt(_PtyPTT(slave), lead, tail)
+    engine._ensure_stream()
+    stream = streams[0]
+    block = engine.blocksize / engine.samplerate
+    t = np.arange(engine.samplerate // 2) / engine.samplerate
+    tone = (0.5 * np.cos(2 * np.pi * 1000 * t)).astype(np.float32)
+
+    ok = True
+    for run in range(runs):
+        done.clear()
+        del changes[:]
+        stream.first_sound = stream.last_sound = None
+        engine.play(tone, engine.samplerate, tag=run)
+        done.wait(5.0)
+        time.sleep(tail + 4 * block + latency)  # let the tail run out
+        keyed = [when for when, byte in changes if byte == b"1"]
+        released = [when for when, byte in changes if byte == b"0"]
+        if not keyed or not released or stream.first_sound is None:
+            print(f"Run {run + 1}: PTT was not keyed and released")
+            ok = False
+            continue
+        measured_lead = stream.first_sound - keyed[0]
+        measured_tail = released[-1] - stream.last_sound
+        run_ok = all(target - 0.002 <= measured <= target + block + 0.005
+                     for measured, target in ((measured_lead, lead), (measured_tail, tail)))
+        ok = ok and run_ok
+        print(f"Run {run + 1}: lead {measured_lead * 1000:.1f} ms (set {lead * 1000:.0f}), "
+              f"tail {measured_tail * 1000:.1f} ms (set {tail * 1000:.0f})"
+              f"{'' if run_ok else '  <-- out of tolerance'}")
+    engine.close()
+    os.close(master)
+    os.close(slave)
+    print("PTT timing OK" if ok else "PTT timing out of tolerance")
+    return ok
+
+
+class KeyerCore:
+    """Message banks, TTS rendering and playback, without any user interface.
+
+    Shared by the window (VoiceKeyerTTS) and the headless daemon
+    (KeyerDaemon). Callbacks from the TTS and audio threads are handed to
+    _call_soon(), which each front end routes to its own event loop.
+    """
+
+    def __init__(self):
+        # One long-lived TTS engine on its own worker thread
+        self.tts = TTSService(verbose=bool(os.environ.get("VOICE_KEYER_TTS_TIMING")))
 
         # Configuration file
-        self.config_file = Path.home() / ".voice_keyer_tts_config.json"
-        self.message_slots = {}
-        self.slot_modes = {}  # "tts" or "rec" per slot
+        self.config_file = CONFIG_FILE
+        self.config_store = ConfigStore(self.config_file)
+        self.bank_names = [DEFAULT_BANK]
+        self.banks = {}  # name -> MessageBank, created on first use
+        self.bank = None
+        self.preferred_voice_id = None
+        self._max_record_seconds = RECORDING_MAX_SECONDS
+        self._repeat_gap = 5.0
+        self._repeat_count = 0
+        self._speed = 150
+        self._volume = 1.0
+        self.macro_values = {}
+        self.ptt_port = ""  # serial port whose RTS/DTR keys the transmitter; "" = VOX
+        self.ptt_line = "RTS"
+        self.ptt_lead = 0.15
+        self.ptt_tail = 0.1
+        self._ptt_opened = None  # (port, line) of the open PTT port
+        self.chain_gap = 0.0  # silence between chained (queued) messages
+        self.preroll = 0.0  # seconds of input kept ahead of each take; 0 = input closed until Record
+        self.vad = False  # Record waits for voice and stops after VAD_HANGOVER of silence
+        self.dvr_minutes = 0  # receive audio kept for replay; 0 = receive recorder off
+        self.dvr_input = ""  # receive input device (name or index); "" = default input
+        self.dvr_output = ""  # output for replays, kept off the transmit audio; "" = default
         self.load_config()
 
         # Ensure recordings directory exists
         RECORDINGS_DIR.mkdir(exist_ok=True)
+        RAW_RECORDINGS_DIR.mkdir(exist_ok=True)
+        self.bank.raw_recording_path("F1").parent.mkdir(parents=True, exist_ok=True)
+
+        # Audio objects are created by _start_audio once the audio libraries have loaded
+        self.audio_ready = False
+        self.recording_bank = None
+        self.playback = None
+        self.tts_cache = None
+        self.stretch_cache = StretchCache()  # audio at Speed settings other than TTS_RENDER_RATE
+        self.clip_bank = ClipBank(stretch_cache=self.stretch_cache)
+        self.playing_tag = None
+        self._play_id = None  # id of the play shown as playing_tag; playback events match on it
+        self._last_play_id = 0
+        self.queued = []  # tags of messages waiting to follow the one playing
+        self._play_token = 0
+        self._repeating = False
+        self._requested_at = None  # LATENCY start time of the play being dispatched
+        self._tts_keys = {}  # (bank, slot) -> cache keys of its current renders
+        self._tts_key_refs = Counter()  # cache key -> number of slots rendering to it
+        self._tts_keys_lock = threading.Lock()
+
+        # Voice enumeration is slow; only do it when no voice was saved
+        self._voice_known = self.preferred_voice_id is not None
+        if not self._voice_known:
+            self.tts.find_female_voice().future.add_done_callback(self._on_voice_found)
+
+    @property
+    def message_slots(self):
+        """Slot texts of the active bank."""
+        return self.bank.texts
+
+    @property
+    def slot_modes(self):
+        """Slot modes ("tts" or "rec") of the active bank."""
+        return self.bank.modes
+
+    @property
+    def slot_processing(self):
+        """Post-processing overrides of the active bank."""
+        return self.bank.processing
+
+    def _get_bank(self, name):
+        """Return a bank, reading it from disk on first use."""
+        if name not in self.banks:
+            self.banks[name] = MessageBank(name)
+        return self.banks[name].load()
+
+    def _call_soon(self, callback):
+        """Run callback on the front end's own thread."""
+        callback()
+
+    def _warn(self, title, message):
+        print(f"{title}: {message}")
+
+    def _start_audio(self, stream_factory=None):
+        """Create the audio objects once load_audio_libraries() has succeeded."""
+        # Playback engine (one persistent output stream) at the device's own rate
+        samplerate = output_samplerate() if stream_factory is None else 44100
+        self.playback = PlaybackEngine(samplerate=samplerate,
+                                       on_finished=self._on_playback_finished,
+                                       on_started=self._on_playback_started,
+                                       stream_factory=stream_factory)
+
+        # Recordings play straight from each bank's memory-mapped archive; only
+        # takes at another rate are converted, once, in the background
+        self.recording_bank = RecordingBank(samplerate)
+        threading.Thread(target=self.recording_bank.load_all, args=(self.bank.archive,),
+                         daemon=True).start()
+        self.clip_bank.samplerate = samplerate
+        threading.Thread(target=self.clip_bank.load, daemon=True).start()
+
+        # Pre-rendered TTS cache
+        self.tts_cache = TTSCache(samplerate=samplerate)
+        self._render_jobs = queue.Queue()
+        threading.Thread(target=self._render_worker, daemon=True).start()
+        if self._voice_known:
+            self._prerender_all()
+        self._prestretch_all()
+        self._apply_ptt()
+
+    def _apply_ptt(self):
+        """Open (or re-time) the PTT port from the current settings."""
+        if self.playback is None:
+            return
+        ptt = self.playback.ptt
+        if (self.ptt_port, self.ptt_line) != self._ptt_opened:
+            ptt = None
+            self.playback.set_ptt(None)
+            if self.ptt_port:
+                try:
+                    ptt = SerialPTT(self.ptt_port, self.ptt_line)
+                except ImportError:
+                    print("Error opening PTT port: pyserial is not installed")
+                except Exception as e:
+                    print(f"Error opening PTT port {self.ptt_port}: {e}")
+            self._ptt_opened = (self.ptt_port, self.ptt_line)
+        self.playback.set_ptt(ptt, self.ptt_lead, self.ptt_tail)
+
+    def _on_voice_found(self, future):
+        """Called from the TTS thread once the installed voices were searched."""
+        voice_id = None if future.cancelled() or future.exception() else future.result()
+
+        def apply():
+            self.preferred_voice_id = voice_id or ""  # "" = engine default, don't search again
+            self._voice_known = True
+            self.save_config()
+            if self.tts_cache is not None:
+                self._prerender_all()
+
+        self._call_soon(apply)
+
+    def _tts_settings(self):
+        """Return (voice_id, rate, volume) for rendering; Speed is applied by time-stretching."""
+        return self.preferred_voice_id or None, TTS_RENDER_RATE, self._volume
+
+    def _speed_factor(self):
+        return speed_factor(self._speed)
+
+    def _stretch_entries(self, keys, entries):
+        """Return rendered TTS entries (by cache key) at the current Speed."""
+        factor = self._speed_factor()
+        return [self.stretch_cache.get(("tts", key), entry, factor)
+                for key, entry in zip(keys, entries)]
+
+    def _render_worker(self):
+        """Render queued TTS texts into the cache, one job at a time.
+
+        A job's texts may be a function returning them, to run its
+        bookkeeping here rather than on the caller's thread.
+        """
+        while True:
+            texts, settings, future = self._render_jobs.get()
+            try:
+                if callable(texts):
+                    texts = texts()
+                entries = []
+                for text in texts:
+                    cache_key = TTSCache.make_key(text, *settings)
+                    if cache_key not in self.tts_cache:
+                        self.tts_cache.render(self.tts, cache_key, text, *settings)
+                    entry = self.tts_cache.get(cache_key)
+                    if entry is not None:
+                        # Stretched now, so the first key press at this Speed is instant too
+                        self._stretch_entries([cache_key], [entry])
+                    entries.append(entry)
+                future.set_result(entries)
+            except Exception as e:
+                print(f"Error rendering TTS: {e}")
+                future.set_exception(e)
+
+    def _submit_render(self, texts, settings):
+        """Queue texts for rendering; return a Future for their [(data, samplerate)]."""
+        future = Future()
+        self._render_jobs.put((texts if callable(texts) else list(texts), settings, future))
+        return future
+
+    def _track_slot_renders(self, bank_name, key, text, settings):
+        """Record the cache keys a slot's text renders to; return (texts, stale keys).
+
+        Keys are reference-counted across slots, so a render is only stale
+        once no slot uses it. Call with _tts_keys_lock held.
+        """
+        slot = (bank_name, key)
+        old_keys = self._tts_keys.pop(slot, [])
+        texts = []
+        if text:
+            texts = static_fragments(text) if has_macros(text) else [text]
+            new_keys = [TTSCache.make_key(t, *settings) for t in texts]
+            self._tts_keys[slot] = new_keys
+            self._tts_key_refs.update(new_keys)
+        self._tts_key_refs.subtract(old_keys)
+        stale = [k for k in set(old_keys) if self._tts_key_refs[k] <= 0]
+        for k in stale:
+            del self._tts_key_refs[k]
+        return texts, stale
+
+    def _prerender_slot(self, key):
+        """Render a slot's current text in the background and drop its stale entries.
+
+        For templates only the static fragments are rendered ahead of time;
+        macro values are rendered when they are set.
+        """
+        if self.tts_cache is None:
+            return
+        settings = self._tts_settings()
+        with self._tts_keys_lock:
+            texts, stale = self._track_slot_renders(self.bank.name, key,
+                                                    self.message_slots.get(key, ""), settings)
+        if texts:
+            self._submit_render(texts, settings)
+        for old_key in stale:
+            self.tts_cache.discard(old_key)
+
+    def _prerender_macros(self):
+        """Render the current macro values so keying a template only joins buffers."""
+        if self.tts_cache is None:
+            return
+        values = [v for v in self.macro_values.values() if _speakable(v)]
+        if values:
+            self._submit_render(values, self._tts_settings())
+
+    def set_macro(self, name, value):
+        """Set a template macro value (e.g. CALL, NR) and pre-render it."""
+        name = name.upper()
+        if name not in MACRO_NAMES:
+            raise ValueError(f"Unknown macro: {name}")
+        value = str(value).strip()
+        if self.macro_values.get(name, "") == value:
+            return
+        self.macro_values[name] = value
+        if self.tts_cache is not None and _speakable(value):
+            self._submit_render([value], self._tts_settings())
+        self.save_config()
+
+    def _prerender_all(self):
+        """Queue renders for every slot of the active bank and the macro values.
+
+        Only the slot texts are copied here; working out what to render
+        and dropping stale renders happen on the render thread. A slot edited
+        in between is skipped there, as _prerender_slot has tracked its new text.
+        """
+        self._prerender_after_id = None
+        if self.tts_cache is None:
+            return
+        bank = self.bank
+        slot_texts = dict(bank.texts)
+        settings = self._tts_settings()
+
+        def texts():
+            todo = []
+            stale = []
+            with self._tts_keys_lock:
+                for key, text in slot_texts.items():
+                    if text and bank.texts.get(key) == text:
+                        slot_todo, slot_stale = self._track_slot_renders(bank.name, key, text,
+                                                                         settings)
+                        todo += slot_todo
+                        stale += slot_stale
+            for old_key in stale:
+                self.tts_cache.discard(old_key)
+            return list(dict.fromkeys(todo))
+
+        self._submit_render(texts, settings)
+        self._prerender_macros()
+
+    def _archive_for(self, key):
+        """Return (archive, name) holding key's recording: the clip bank for clip keys."""
+        if key.startswith(CLIP_KEY_PREFIX):
+            return self.clip_bank.archive, key[len(CLIP_KEY_PREFIX):]
+        return self.bank.archive, key
+
+    def _raw_recording_path(self, key):
+        """Return the unprocessed take for a slot of the active bank, or for a clip."""
+        archive, name = self._archive_for(key)
+        return archive.directory / "raw" / f"{name}.wav"
+
+    def _has_recording(self, key):
+        """Check if a recording exists for the given key."""
+        archive, name = self._archive_for(key)
+        return name in archive
+
+    def _recording_info(self, key):
+        """Return the archive entry (duration, levels, peaks) of a slot's recording, or None."""
+        archive, name = self._archive_for(key)
+        return archive.entry(name)
+
+    def _prepare_recording(self, key):
+        """Get a newly processed recording ready to play (converted, or faded for clips,
+        and stretched to the current Speed)."""
+        archive, name = self._archive_for(key)
+        if archive is self.clip_bank.archive:
+            self.clip_bank.stretched(name, self._speed_factor())
+        else:
+            self._stretched_recording(key)
+
+    def _rec_label_text(self, info):
+        """Return the recording info label text for an archive entry."""
+        if info:
+            return f"Recorded ({info['duration']:.1f}s)"
+        return "No recording"
+
+    def play_message(self, key, requested_at=None):
+        """Play the message assigned to key (TTS or recording); return False if there is none.
+
+        requested_at is the LATENCY time of the key press, if the front end took it earlier.
+        """
+        if key not in self.bank.keys():
+            return False
+        start = LATENCY.now()
+        self._requested_at = requested_at if requested_at is not None else start
+        mode = self.slot_modes.get(key, "tts")
+
+        if mode == "rec" and RECORDING_AVAILABLE:
+            played = self._play_recording(key)
+        elif mode == "clips" and RECORDING_AVAILABLE:
+            played = self._play_clips(key)
+        else:
+            played = self._play_tts(key)
+        LATENCY.since("play dispatch", start)
+        return played
+
+    def queue_message(self, key, requested_at=None):
+        """Play key's message chain_gap seconds after the current and already queued ones.
+
+        Plays at once if nothing is playing.
+        """
+        if self.playback is None or (self.playback.state == PlaybackEngine.IDLE and not self.queued):
+            return self.play_message(key, requested_at)
+        if key not in self.bank.keys():
+            return False
+        self._requested_at = None  # its wait in the queue is not key-to-audio latency
+        mode = self.slot_modes.get(key, "tts")
+        if mode == "rec" and RECORDING_AVAILABLE:
+            return self._play_recording(key, queued=True)
+        if mode == "clips" and RECORDING_AVAILABLE:
+            return self._play_clips(key, queued=True)
+        return self._play_tts(key, queued=True)
+
+    def _play_tts(self, key, queued=False):
+        """Speak the TTS message for a key."""
+        text = self.message_slots.get(key, "").strip()
+
+        if not text:
+            self._warn("No Message", f"No message entered for {key}")
+            return False
+
+        if self.playback is None:
+            self._speak_live(text, key)
+        elif queued:
+            self._play_text(text, key, queued=True)
+        else:
+            self._play_text(text, key, *self._repeat_settings())
+        return True
+
+    def _play_text(self, text, tag, count=1, gap=0.0, queued=False):
+        """Play text from the TTS cache, rendering only the pieces that are missing.
+
+        A template is played as its cached fragments joined into one buffer.
+        """
+        settings = self._tts_settings()
+        requested_at = self._requested_at
+        texts = expand_fragments(text, self.macro_values) if has_macros(text) else [text]
+        if not texts:
+            return
+        play_id = self._new_play_id()
+        if queued:
+            token = self._play_token  # a queued message doesn't cancel anything
+            self._add_to_queue(tag)
+        else:
+            token = self._next_play_token()
+            self._repeating = count != 1
+            self._mark_playing(tag, play_id)
+
+        keys = [TTSCache.make_key(t, *settings) for t in texts]
+        entries = [self.tts_cache.get(key) for key in keys]
+        if None not in entries:
+            self._play_entries(self._stretch_entries(keys, entries), tag, play_id, count, gap,
+                               queued, requested_at)
+            return
+
+        def on_rendered(future):
+            # Skip if another key or Stop was pressed while rendering
+            rendered = None if future.exception() else iter(future.result())
+            full = None
+            if rendered is not None:
+                full = [entry if entry is not None else next(rendered) for entry in entries]
+            if token == self._play_token and full is not None and None not in full:
+                full = self._stretch_entries(keys, full)
+                if queued:
+                    # Enqueue on the front end's thread, in step with the queue list
+                    self._call_soon(lambda: self._play_entries(full, tag, play_id, queued=True,
+                                                               requested_at=requested_at))
+                else:
+                    self._play_entries(full, tag, play_id, count, gap, requested_at=requested_at)
+            else:
+                self._call_soon(lambda: self._mark_idle(play_id))
+
+        missing = [t for t, entry in zip(texts, entries) if entry is None]
+        self._submit_render(missing, settings).add_done_callback(on_rendered)
+
+    def _play_entries(self, entries, tag, play_id, count=1, gap=0.0, queued=False,
+                      requested_at=None):
+        """Play one rendered buffer, or several joined into one gapless buffer."""
+        data, samplerate = entries[0] if len(entries) == 1 else join_fragments(entries)
+        if queued:
+            if tag in self.queued:  # not dropped by Stop while rendering
+                self._send_to_playback(data, samplerate, tag, play_id, queued=True,
+                                       delay=self.chain_gap, requested_at=requested_at)
+        else:
+            self._send_to_playback(data, samplerate, tag, play_id, count=count, gap=gap,
+                                   requested_at=requested_at)
+
+    def _send_to_playback(self, data, samplerate, tag, play_id, queued=False, **options):
+        """Play or chain a buffer; if the output can't be opened, report it and free the slot.
+
+        The engine's tag is (tag, play_id), so its events are matched to this play
+        even when the same slot is keyed again before they arrive.
+        """
+        try:
+            if queued:
+                self.playback.enqueue(data, samplerate, tag=(tag, play_id), **options)
+            else:
+                self.playback.play(data, samplerate, tag=(tag, play_id), **options)
+            return True
+        except Exception as e:
+            print(f"Error starting playback: {e}")
+            message = str(e)
+
+            def failed():
+                if tag in self.queued:
+                    self.queued.remove(tag)
+                    self._queue_changed()
+                self._repeating = False
+                self._mark_idle(play_id)
+                self._warn("Playback Failed", message)
+
+            self._call_soon(failed)
+            return False
+
+    def _speak_live(self, text, tag):
+        """Speak text directly through the TTS engine (no sounddevice available)."""
+        self.tts.cancel()
+        self._next_play_token()
+        play_id = self._new_play_id()
+        self._mark_playing(tag, play_id)
+        voice_id, _, volume = self._tts_settings()
+        text = expand_macros(text, self.macro_values)
+        job = self.tts.speak(text, voice=voice_id, rate=self._speed, volume=volume)
+        requested_at = self._requested_at
+
+        def on_spoken(future):
+            if requested_at is not None and job.started_at is not None:
+                LATENCY.add("key to speech", job.started_at - requested_at)
+            if not future.cancelled() and future.exception():
+                print(f"Error speaking: {future.exception()}")
+            self._call_soon(lambda: self._mark_idle(play_id))
+
+        job.future.add_done_callback(on_spoken)
+
+    def _play_recording(self, key, queued=False):
+        """Play the recording of a key (a slot or a clip) from its archive, at the current Speed."""
+        try:
+            entry = self._stretched_recording(key)
+        except Exception as e:
+            print(f"Error playing recording: {e}")
+            return False
+        if entry is None:
+            self._warn("No Recording", f"No recording saved for {key}")
+            return False
+        return self._play_buffer(entry, key, queued)
+
+    def _stretched_recording(self, key):
+        """Return (data, samplerate) of key's recording at the current Speed, or None."""
+        archive, name = self._archive_for(key)
+        info = archive.entry(name)
+        entry = self.recording_bank.get(archive, name)
+        if entry is None or info is None:
+            return None
+        source = ("rec", str(archive.directory), name, info["version"])
+        return self.stretch_cache.get(source, entry, self._speed_factor())
+
+    def _prestretch_all(self):
+        """Stretch the active bank's audio to the current Speed in the background."""
+        factor = self._speed_factor()
+        if self.playback is None or factor == 1:
+            return
+        bank = self.bank
+        with self._tts_keys_lock:
+            tts_keys = [k for (name, _), keys in self._tts_keys.items() if name == bank.name
+                        for k in keys]
+        tts_keys += [TTSCache.make_key(v, *self._tts_settings())
+                     for v in self.macro_values.values() if _speakable(v)]
+        modes = [bank.modes.get(key, "tts") for key in bank.keys()]
+        rec_keys = [key for key, mode in zip(bank.keys(), modes) if mode == "rec"]
+
+        def work():
+            try:
+                for cache_key in tts_keys:
+                    entry = self.tts_cache.get(cache_key)
+                    if entry is not None:
+                        self.stretch_cache.get(("tts", cache_key), entry, factor)
+                for key in rec_keys:
+                    if key in bank.archive:
+                        self._stretched_recording(key)
+                if "clips" in modes:
+                    for name in self.clip_bank.archive.keys():
+                        self.clip_bank.stretched(name, factor)
+            except Exception as e:
+                print(f"Error stretching audio: {e}")
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def _play_clips(self, key, queued=False):
+        """Say a slot's text (macros expanded) by joining recorded clips."""
+        text = expand_macros(self.message_slots.get(key, ""), self.macro_values)
+        names = clip_sequence(text)
+        if not names:
+            self._warn("No Message", f"No message entered for {key}")
+            return False
+        start = LATENCY.now()
+        entry = self.clip_bank.assemble(names, self._speed_factor())
+        LATENCY.since("clip assembly", start)
+        if entry is None:
+            missing = ", ".join(self.clip_bank.missing(names))
+            self._warn("Missing Clips", f"Record these clips first: {missing}")
+            return False
+        return self._play_buffer(entry, key, queued)
+
+    def _play_buffer(self, entry, key, queued=False):
+        """Play (or chain) a ready (data, samplerate) buffer for key."""
+        play_id = self._new_play_id()
+        if queued:
+            self._add_to_queue(key)
+            return self._send_to_playback(*entry, key, play_id, queued=True, delay=self.chain_gap,
+                                          requested_at=self._requested_at)
+        count, gap = self._repeat_settings()
+        self._next_play_token()
+        self._repeating = count != 1
+        self._mark_playing(key, play_id)
+        return self._send_to_playback(*entry, key, play_id, count=count, gap=gap,
+                                      requested_at=self._requested_at)
+
+    def _repeat_settings(self):
+        """Return (count, gap) for play_message; count None repeats until stopped."""
+        return 1, 0.0
+
+    def _new_play_id(self):
+        """Return a unique id for one play (slot tags repeat across plays and banks)."""
+        self._last_play_id += 1
+        return self._last_play_id
+
+    def _next_play_token(self):
+        """Invalidate any pending (not yet started) play request, queued ones included."""
+        self._play_token += 1
+        if self.queued:
+            self.queued = []
+            self._queue_changed()
+        return self._play_token
+
+    def _add_to_queue(self, tag):
+        self.queued.append(tag)
+        self._queue_changed()
+
+    def _queue_changed(self):
+        """Called when self.queued changes; front ends show it."""
+
+    def _on_playback_started(self, play):
+        """Called from the playback notifier thread when a queued message starts."""
+        tag, play_id = play
+
+        def started():
+            if tag in self.queued:
+                self.queued.remove(tag)
+                self._queue_changed()
+            self._mark_playing(tag, play_id)
+
+        self._call_soon(started)
+
+    def _mark_playing(self, tag, play_id):
+        self.playing_tag = tag
+        self._play_id = play_id
+
+    def _mark_idle(self, play_id):
+        """Clear the playing state if play_id is still the current play; return whether it was."""
+        if self._play_id != play_id:
+            return False
+        self.playing_tag = None
+        self._play_id = None
+        return True
+
+    def _on_playback_finished(self, play, completed):
+        """Called from the playback notifier thread when a message ends or is pre-empted."""
+        _, play_id = play
+
+        def finished():
+            if completed and play_id == self._play_id:
+                self._repeating = False  # a finite repeat ran out; keys no longer stop anything
+            self._mark_idle(play_id)
+
+        self._call_soon(finished)
+
+    def stop_speech(self):
+        """Stop current playback within one audio block"""
+        self._next_play_token()
+        self._repeating = False
+        self._mark_idle(self._play_id)
+        if self.playback is not None:
+            self.playback.stop()
+        else:
+            self.tts.cancel()
+
+    def close(self):
+        """Write pending config and bank changes and release the output stream."""
+        self.config_store.flush()
+        for bank in self.banks.values():
+            bank.flush()
+        if self.playback is not None:
+            self.playback.close()
+
+    def save_config(self):
+        """Save configuration to file"""
+        try:
+            # Slot texts and modes are saved in each bank's own file
+            self.bank.save()
+
+            config = {
+                'banks': self.bank_names,
+                'active_bank': self.bank.name,
+                'speed': self._speed,
+                'volume': self._volume,
+                'voice_id': self.preferred_voice_id,
+                'max_record_seconds': self._max_record_seconds,
+                'repeat_gap': self._repeat_gap,
+                'repeat_count': self._repeat_count,
+                'macros': self.macro_values,
+                'ptt_port': self.ptt_port,
+                'ptt_line': self.ptt_line,
+                'ptt_lead': self.ptt_lead,
+                'ptt_tail': self.ptt_tail,
+                'chain_gap': self.chain_gap,
+                'preroll': self.preroll,
+                'vad': self.vad,
+                'dvr_minutes': self.dvr_minutes,
+                'dvr_input': self.dvr_input,
+                'dvr_output': self.dvr_output
+            }
+            self.config_store.save(config)
+        except Exception as e:
+            print(f"Error saving config: {e}")
+
+    def load_config(self):
+        """Load configuration from file"""
+        active = DEFAULT_BANK
+        try:
+            config = self.config_store.load()
+            if 'messages' in config:
+                # Slots saved before banks existed become the default bank
+                default = MessageBank(DEFAULT_BANK)
+                if not default.path.exists():
+                    default.load().update_from_config(config['messages'], config.get('processing'))
+                    default.save()
+                    default.flush()
+                self.banks[DEFAULT_BANK] = default
+            self.bank_names = [DEFAULT_BANK] + [name for name in config.get('banks', [])
+                                                if name != DEFAULT_BANK]
+            active = config.get('active_bank', DEFAULT_BANK)
+            self._speed = config.get('speed', self._speed)
+            self._volume = config.get('volume', self._volume)
+            self.preferred_voice_id = config.get('voice_id')
+            self._max_record_seconds = config.get('max_record_seconds', RECORDING_MAX_SECONDS)
+            self._repeat_gap = config.get('repeat_gap', self._repeat_gap)
+            self._repeat_count = config.get('repeat_count', self._repeat_count)
+            self.macro_values = {name: str(value) for name, value in config.get('macros', {}).items()
+                                 if name in MACRO_NAMES}
+            self.ptt_port = config.get('ptt_port', self.ptt_port)
+            self.ptt_line = config.get('ptt_line', self.ptt_line)
+            self.ptt_lead = config.get('ptt_lead', self.ptt_lead)
+            self.ptt_tail = config.get('ptt_tail', self.ptt_tail)
+            self.chain_gap = config.get('chain_gap', self.chain_gap)
+            self.preroll = min(config.get('preroll', self.preroll), PREROLL_MAX_SECONDS)
+            self.vad = config.get('vad', self.vad)
+            self.dvr_minutes = min(config.get('dvr_minutes', self.dvr_minutes), DVR_MAX_MINUTES)
+            self.dvr_input = config.get('dvr_input', self.dvr_input)
+            self.dvr_output = config.get('dvr_output', self.dvr_output)
+        except Exception as e:
+            print(f"Error loading config: {e}")
+        self.bank = self._get_bank(active if active in self.bank_names else DEFAULT_BANK)
+
+
+class _SlotRow:
+    """Widgets of one visible slot row; key is the slot it currently shows."""
+    key = None
+
+
+class VoiceKeyerTTS(KeyerCore):
+    """The keyer window: slot rows, settings and keyboard shortcuts."""
+
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Voice Keyer - Text-to-Speech")
+        self.root.geometry("800x750")
+        self.root.minsize(700, 650)
+
+        self.macro_vars = {}
+        super().__init__()
 
         # Recording state
         self.is_recording = False
         self.recording_key = None
-        self.recorded_data = []
+        self.recorder = None  # None while a voice-activated take waits for voice
+        self.input_monitor = None  # open between takes when pre-roll or VAD is on
+        self._armed_at = 0  # monitor position when a voice-activated take was armed
+
+        # Receive-audio recorder and the output its replays play on
+        self.dvr = None
+        self._dvr_opened = None  # (minutes, input) the open receive recorder was made with
+        self.replay = None
+
+        # Pending re-render (volume) or re-stretch (speed) after a slider change
+        self._prerender_after_id = None
+        self._prestretch_after_id = None
+
+        # Clip bank window (show_clip_bank)
+        self.clips_window = None
+        self._clip_rows = {}  # clip key -> _SlotRow in the open window
 
         # Create GUI
         self.create_widgets()
@@ -54,54 +2922,84 @@ class VoiceKeyerTTS:
         # Bind keyboard shortcuts
         self.bind_shortcuts()
 
-        # Playing flag
-        self.is_playing = False
+        # Persist slider changes and flush pending config writes on exit
+        self.speed_var.trace_add('write', lambda *args: self.save_config())
+        self.volume_var.trace_add('write', lambda *args: self.save_config())
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
-    def _find_female_voice_id(self):
-        """Find a female voice ID to use."""
-        engine = pyttsx3.init()
-        voices = engine.getProperty('voices')
-        voice_id = None
-        for voice in voices:
-            if 'female' in voice.name.lower() or 'woman' in voice.name.lower():
-                voice_id = voice.id
-                break
-            elif any(name in voice.name.lower() for name in ['zira', 'hazel', 'samantha', 'victoria', 'karen']):
-                voice_id = voice.id
-                break
-        if voice_id is None and len(voices) > 1:
-            voice_id = voices[1].id
-        engine.stop()
-        del engine
-        return voice_id
-
-    def _create_engine(self):
-        """Create a fresh TTS engine with current settings."""
-        engine = pyttsx3.init()
-        if self.preferred_voice_id:
-            engine.setProperty('voice', self.preferred_voice_id)
-        engine.setProperty('rate', self.speed_var.get())
-        engine.setProperty('volume', self.volume_var.get())
-        return engine
-
-    def _recording_path(self, key):
-        """Return the WAV file path for a given F-key slot."""
-        return RECORDINGS_DIR / f"{key}.wav"
+        # Heavy imports and recording scans happen off the Tk thread
+        visible = [row.key for row in self._rows if row.key is not None]
+        threading.Thread(target=self._startup_worker, args=(visible,), daemon=True).start()
+        if LATENCY.enabled:
+            self.root.after_idle(lambda: LATENCY.add("startup: window",
+                                                     time.perf_counter() - _START_TIME))
 
-    def _has_recording(self, key):
-        """Check if a recording exists for the given key."""
-        return self._recording_path(key).exists()
+    def _startup_worker(self, keys):
+        """Load audio libraries and recording info in the background."""
+        start = LATENCY.now()
+        available = load_audio_libraries()
+        LATENCY.since("startup: audio libraries", start)
+        infos = {}
+        if available:
+            self.bank.archive.migrate()  # WAV files of earlier versions, once
+            infos = {key: self._recording_info(key) for key in keys}
+        self.root.after(0, lambda: self._on_audio_ready(available, infos))
 
-    def _recording_duration(self, key):
-        """Get duration in seconds of a recording, or None."""
-        path = self._recording_path(key)
-        if not path.exists():
-            return None
-        try:
-            info = sf.info(str(path))
-            return info.duration
-        except Exception:
-            return None
+    def _on_audio_ready(self, available, infos):
+        """Finish startup on the Tk thread once the audio libraries are loaded."""
+        self.audio_ready = True
+        if available:
+            self._start_audio()
+            LATENCY.add("startup: audio ready", time.perf_counter() - _START_TIME)
+            self.speed_var.trace_add('write', lambda *args: self._schedule_prestretch_all())
+            self.volume_var.trace_add('write', lambda *args: self._schedule_prerender_all())
+
+            for row in self._rows:
+                if row.key in infos:
+                    self._show_recording_info(row, infos[row.key])
+                for widget in row.mode_frame.winfo_children():
+                    widget.config(state=tk.NORMAL)
+                row.record_button.config(state=tk.NORMAL)
+                row.fx_button.config(state=tk.NORMAL)
+            self.process_all_button.config(state=tk.NORMAL)
+            self.clips_button.config(state=tk.NORMAL)
+            self._apply_input_monitor()
+            self._apply_dvr()
+        else:
+            # TTS falls back to speaking live through pyttsx3
+            for row in self._rows:
+                row.mode_frame.pack_forget()
+            self.recording_note.pack(pady=2)
+
+    def _call_soon(self, callback):
+        self.root.after(0, callback)
+
+    def _warn(self, title, message):
+        messagebox.showwarning(title, message)
+
+    def set_macro(self, name, value):
+        """Set a template macro value and show it in the Macros row."""
+        super().set_macro(name, value)
+        var = self.macro_vars.get(name.upper())
+        value = self.macro_values.get(name.upper(), "")
+        if var is not None and var.get() != value:
+            var.set(value)
+
+    def _schedule_prerender_all(self):
+        """Re-render all slots once the volume slider settles."""
+        if self._prerender_after_id is not None:
+            self.root.after_cancel(self._prerender_after_id)
+        self._prerender_after_id = self.root.after(500, self._prerender_all)
+
+    def _schedule_prestretch_all(self):
+        """Stretch the bank's audio to the new Speed once the slider settles."""
+        if self._prestretch_after_id is not None:
+            self.root.after_cancel(self._prestretch_after_id)
+        self._prestretch_after_id = self.root.after(300, self._prestretch_all)
+
+    def _prestretch_all(self):
+        self._prestretch_after_id = None
+        super()._prestretch_all()
 
     def create_widgets(self):
         # Title
@@ -111,7 +3009,7 @@ class VoiceKeyerTTS:
         # Instructions
         instructions = tk.Label(
             self.root,
-            text="Enter text messages for F1-F8 keys, then press the key to speak the message",
+            text="Enter a message in each slot; F1-F8 play slots 1-8 of the active bank, Play plays any slot",
             font=("Arial", 10)
         )
         instructions.pack(pady=5)
@@ -122,11 +3020,12 @@ class VoiceKeyerTTS:
 
         # Speed control
         tk.Label(settings_frame, text="Speed:").grid(row=0, column=0, padx=5)
-        self.speed_var = tk.IntVar(value=150)
+        self.speed_var = tk.IntVar(value=self._speed)
         speed_scale = tk.Scale(
             settings_frame,
             from_=80,
             to=250,
+            resolution=SPEED_STEP,
             orient=tk.HORIZONTAL,
             variable=self.speed_var,
             length=200
@@ -135,7 +3034,7 @@ class VoiceKeyerTTS:
 
         # Volume control
         tk.Label(settings_frame, text="Volume:").grid(row=0, column=2, padx=5)
-        self.volume_var = tk.DoubleVar(value=1.0)
+        self.volume_var = tk.DoubleVar(value=self._volume)
         volume_scale = tk.Scale(
             settings_frame,
             from_=0.0,
@@ -147,93 +3046,164 @@ class VoiceKeyerTTS:
         )
         volume_scale.grid(row=0, column=3, padx=5)
 
+        # Recording length limit
+        tk.Label(settings_frame, text="Max rec (s):").grid(row=1, column=0, padx=5)
+        self.max_record_var = tk.IntVar(value=self._max_record_seconds)
+        max_record_spin = tk.Spinbox(
+            settings_frame,
+            from_=5,
+            to=600,
+            increment=5,
+            textvariable=self.max_record_var,
+            width=5,
+            command=self.save_config
+        )
+        max_record_spin.grid(row=1, column=1, padx=5, sticky=tk.W)
+
+        # Auto-repeat (e.g. calling CQ): gap after each message, count 0 = until stopped
+        repeat_frame = tk.Frame(settings_frame)
+        repeat_frame.grid(row=1, column=2, columnspan=2, padx=5, sticky=tk.W)
+        self.repeat_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(repeat_frame, text="Auto-repeat", variable=self.repeat_var).pack(side=tk.LEFT)
+        tk.Label(repeat_frame, text="Gap (s):").pack(side=tk.LEFT, padx=(10, 2))
+        self.repeat_gap_var = tk.DoubleVar(value=self._repeat_gap)
+        tk.Spinbox(repeat_frame, from_=0.0, to=120.0, increment=0.5, width=5,
+                   textvariable=self.repeat_gap_var, command=self.save_config).pack(side=tk.LEFT)
+        tk.Label(repeat_frame, text="Count (0=\u221e):").pack(side=tk.LEFT, padx=(10, 2))
+        self.repeat_count_var = tk.IntVar(value=self._repeat_count)
+        tk.Spinbox(repeat_frame, from_=0, to=999, width=4,
+                   textvariable=self.repeat_count_var, command=self.save_config).pack(side=tk.LEFT)
+        # Silence between messages chained with Shift+F-key
+        tk.Label(repeat_frame, text="Chain gap (s):").pack(side=tk.LEFT, padx=(10, 2))
+        self.chain_gap_var = tk.DoubleVar(value=self.chain_gap)
+        chain_spin = tk.Spinbox(repeat_frame, from_=0.0, to=5.0, increment=0.1, width=4,
+                                textvariable=self.chain_gap_var, command=self.save_config)
+        chain_spin.pack(side=tk.LEFT)
+        chain_spin.bind('<FocusOut>', lambda e: self.save_config())
+
+        # PTT through a serial port's RTS/DTR line; blank port = rely on VOX
+        tk.Label(settings_frame, text="PTT port:").grid(row=2, column=0, padx=5)
+        ptt_frame = tk.Frame(settings_frame)
+        ptt_frame.grid(row=2, column=1, columnspan=3, padx=5, sticky=tk.W)
+        self.ptt_port_var = tk.StringVar(value=self.ptt_port)
+        ptt_entry = tk.Entry(ptt_frame, textvariable=self.ptt_port_var, width=14)
+        ptt_entry.pack(side=tk.LEFT)
+        ptt_entry.bind('<FocusOut>', lambda e: self._on_ptt_change())
+        ptt_entry.bind('<Return>', lambda e: self._on_ptt_change())
+        self.ptt_line_var = tk.StringVar(value=self.ptt_line)
+        tk.OptionMenu(ptt_frame, self.ptt_line_var, *SerialPTT.LINES,
+                      command=lambda value: self._on_ptt_change()).pack(side=tk.LEFT, padx=5)
+        self.ptt_lead_var = tk.DoubleVar(value=self.ptt_lead)
+        self.ptt_tail_var = tk.DoubleVar(value=self.ptt_tail)
+        for label, var in (("Lead (s):", self.ptt_lead_var), ("Tail (s):", self.ptt_tail_var)):
+            tk.Label(ptt_frame, text=label).pack(side=tk.LEFT, padx=(10, 2))
+            spin = tk.Spinbox(ptt_frame, from_=0.0, to=2.0, increment=0.05, width=5,
+                              textvariable=var, command=self._on_ptt_change)
+            spin.pack(side=tk.LEFT)
+            spin.bind('<FocusOut>', lambda e: self._on_ptt_change())
+
+        # Pre-roll kept from the always-open input, and voice-activated start/stop
+        tk.Label(settings_frame, text="Pre-roll (s):").grid(row=3, column=0, padx=5)
+        input_frame = tk.Frame(settings_frame)
+        input_frame.grid(row=3, column=1, columnspan=3, padx=5, sticky=tk.W)
+        self.preroll_var = tk.DoubleVar(value=self.preroll)
+        preroll_spin = tk.Spinbox(input_frame, from_=0.0, to=PREROLL_MAX_SECONDS, increment=0.1,
+                                  width=4, textvariable=self.preroll_var,
+                                  command=self._on_input_change)
+        preroll_spin.pack(side=tk.LEFT)
+        preroll_spin.bind('<FocusOut>', lambda e: self._on_input_change())
+        self.vad_var = tk.BooleanVar(value=self.vad)
+        tk.Checkbutton(input_frame, text="Start/stop recording on voice", variable=self.vad_var,
+                       command=self._on_input_change).pack(side=tk.LEFT, padx=(10, 0))
+
+        # Template macro values, e.g. "{CALL} you are {RST} {NR}"
+        macro_frame = tk.LabelFrame(self.root, text="Macros", padx=10, pady=5)
+        macro_frame.pack(pady=5, padx=20, fill=tk.X)
+        self.macro_vars = {}
+        for column, name in enumerate(MACRO_NAMES):
+            tk.Label(macro_frame, text=f"{{{name}}}").grid(row=0, column=column * 2, padx=(5, 2))
+            var = tk.StringVar(value=self.macro_values.get(name, ""))
+            entry = tk.Entry(macro_frame, textvariable=var, width=10, font=("Arial", 10))
+            entry.grid(row=0, column=column * 2 + 1, padx=(0, 5))
+            entry.bind('<FocusOut>', lambda e, n=name: self.set_macro(n, self.macro_vars[n].get()))
+            entry.bind('<Return>', lambda e, n=name: self.set_macro(n, self.macro_vars[n].get()))
+            self.macro_vars[name] = var
+
+        # Receive-audio recorder: replay the last seconds of the receiver, or export them
+        dvr_frame = tk.LabelFrame(self.root, text="Receive Recorder", padx=10, pady=5)
+        dvr_frame.pack(pady=5, padx=20, fill=tk.X)
+        tk.Label(dvr_frame, text="Keep (min):").pack(side=tk.LEFT, padx=(5, 2))
+        self.dvr_minutes_var = tk.IntVar(value=self.dvr_minutes)
+        dvr_spin = tk.Spinbox(dvr_frame, from_=0, to=DVR_MAX_MINUTES, width=3,
+                              textvariable=self.dvr_minutes_var, command=self._on_dvr_change)
+        dvr_spin.pack(side=tk.LEFT)
+        dvr_spin.bind('<FocusOut>', lambda e: self._on_dvr_change())
+        self.dvr_input_var = tk.StringVar(value=self.dvr_input)
+        self.dvr_output_var = tk.StringVar(value=self.dvr_output)
+        for label, var in (("RX in:", self.dvr_input_var), ("Replay out:", self.dvr_output_var)):
+            tk.Label(dvr_frame, text=label).pack(side=tk.LEFT, padx=(10, 2))
+            entry = tk.Entry(dvr_frame, textvariable=var, width=10)
+            entry.pack(side=tk.LEFT)
+            entry.bind('<FocusOut>', lambda e: self._on_dvr_change())
+            entry.bind('<Return>', lambda e: self._on_dvr_change())
+        for seconds, key in zip(DVR_REPLAY_SECONDS, ("F9", "F10", "F11")):
+            tk.Button(dvr_frame, text=f"{seconds} s ({key})", width=8,
+                      command=lambda s=seconds: self.replay_last(s)).pack(side=tk.LEFT, padx=(5, 0))
+        tk.Button(dvr_frame, text="Export...", width=8,
+                  command=self.export_dvr).pack(side=tk.LEFT, padx=(5, 0))
+        self.dvr_label = tk.Label(dvr_frame, text="Off", font=("Arial", 8), fg="gray")
+        self.dvr_label.pack(side=tk.LEFT, padx=5)
+
+        # Bank selector
+        bank_frame = tk.Frame(self.root)
+        bank_frame.pack(pady=(5, 0), padx=20, fill=tk.X)
+        tk.Label(bank_frame, text="Bank:").pack(side=tk.LEFT, padx=5)
+        self.bank_var = tk.StringVar(value=self.bank.name)
+        self.bank_combo = ttk.Combobox(bank_frame, textvariable=self.bank_var, values=self.bank_names,
+                                       state="readonly", width=20)
+        self.bank_combo.pack(side=tk.LEFT, padx=5)
+        self.bank_combo.bind('<<ComboboxSelected>>', lambda e: self.switch_bank(self.bank_var.get()))
+        tk.Button(bank_frame, text="New Bank", width=10, command=self.new_bank).pack(side=tk.LEFT, padx=5)
+        tk.Button(bank_frame, text="Add Slot", width=10, command=self.add_slot).pack(side=tk.LEFT, padx=5)
+        tk.Label(bank_frame, text="(Ctrl+1-9 switches bank)", font=("Arial", 8), fg="gray").pack(side=tk.LEFT, padx=5)
+
         # Frame for message slots
         self.slots_frame = tk.Frame(self.root)
         self.slots_frame.pack(pady=10, padx=20, fill=tk.BOTH, expand=True)
 
-        # Create 8 slots for F1-F8
-        self.text_entries = {}
-        self.play_buttons = {}
-        self.mode_vars = {}
-        self.record_buttons = {}
-        self.rec_labels = {}
-        self.tts_frames = {}
-        self.rec_frames = {}
+        self.slot_scrollbar = tk.Scrollbar(self.slots_frame, orient=tk.VERTICAL, command=self._on_scroll)
+        self.slot_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        rows_frame = tk.Frame(self.slots_frame)
+        rows_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
-        for i in range(1, 9):
-            key = f"F{i}"
-            frame = tk.Frame(self.slots_frame)
-            frame.pack(fill=tk.X, pady=3)
-
-            # Key label
-            key_label = tk.Label(frame, text=f"{key}:", width=4, font=("Arial", 10, "bold"))
-            key_label.pack(side=tk.LEFT, padx=(5, 2))
-
-            # Mode toggle
-            mode = self.slot_modes.get(key, "tts")
-            mode_var = tk.StringVar(value=mode)
-            self.mode_vars[key] = mode_var
-
-            if RECORDING_AVAILABLE:
-                mode_frame = tk.Frame(frame)
-                mode_frame.pack(side=tk.LEFT, padx=2)
-                tts_rb = tk.Radiobutton(mode_frame, text="TTS", variable=mode_var, value="tts",
-                                        command=lambda k=key: self._on_mode_change(k))
-                tts_rb.pack(side=tk.LEFT)
-                rec_rb = tk.Radiobutton(mode_frame, text="Rec", variable=mode_var, value="rec",
-                                        command=lambda k=key: self._on_mode_change(k))
-                rec_rb.pack(side=tk.LEFT)
-
-            # TTS frame (text entry)
-            tts_frame = tk.Frame(frame)
-            self.tts_frames[key] = tts_frame
-
-            text_entry = tk.Entry(tts_frame, font=("Arial", 10))
-            text_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
-            text_entry.insert(0, self.message_slots.get(key, ""))
-            text_entry.bind('<FocusOut>', lambda e, k=key: self.save_message(k))
-            text_entry.bind('<Return>', lambda e, k=key: self.play_message(k))
-            self.text_entries[key] = text_entry
-
-            # Rec frame (recording info + record button)
-            rec_frame = tk.Frame(frame)
-            self.rec_frames[key] = rec_frame
-
-            rec_label = tk.Label(rec_frame, text="No recording", font=("Arial", 9), width=20, anchor=tk.W)
-            rec_label.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
-            self.rec_labels[key] = rec_label
-
-            if RECORDING_AVAILABLE:
-                rec_btn = tk.Button(
-                    rec_frame, text="Record", width=8,
-                    command=lambda k=key: self._toggle_recording(k),
-                    bg="#888888", fg="white"
-                )
-                rec_btn.pack(side=tk.LEFT, padx=2)
-                self.record_buttons[key] = rec_btn
-
-            # Play button
-            play_btn = tk.Button(
-                frame,
-                text="Play",
-                command=lambda k=key: self.play_message(k),
-                bg="#4CAF50",
-                fg="white",
-                width=8
-            )
-            play_btn.pack(side=tk.RIGHT, padx=5)
-            self.play_buttons[key] = play_btn
-
-            # Show correct frame based on mode
-            self._show_mode_frame(key, mode)
-
-        # Update recording labels
-        self._update_all_rec_labels()
+        # A fixed pool of rows, re-bound to slots as the list scrolls, so the
+        # widget count does not grow with the size of the bank
+        self._rows = [self._create_slot_row(rows_frame) for _ in range(VISIBLE_ROWS)]
+        self._first_row = 0
+        self._refresh_rows()
 
         # Control buttons
         control_frame = tk.Frame(self.root)
         control_frame.pack(pady=10)
 
+        # Input level meter, shown above the buttons while recording
+        self.meter_frame = tk.Frame(self.root)
+        tk.Label(self.meter_frame, text="Input:").pack(side=tk.LEFT, padx=5)
+        self.meter_canvas = tk.Canvas(self.meter_frame, width=240, height=12, bg="#222222",
+                                      highlightthickness=0)
+        self.meter_canvas.pack(side=tk.LEFT)
+        self.meter_rms = self.meter_canvas.create_rectangle(0, 0, 0, 12, fill="#4CAF50", width=0)
+        self.meter_peak = self.meter_canvas.create_line(0, 0, 0, 12, fill="#FFC107", width=2)
+        self.meter_label = tk.Label(self.meter_frame, width=16, font=("Arial", 9), anchor=tk.W)
+        self.meter_label.pack(side=tk.LEFT, padx=5)
+        self.clip_label = tk.Label(self.meter_frame, text="CLIP", width=5, bg="#888888", fg="white")
+        self.clip_label.pack(side=tk.LEFT)
+        self._meter_before = control_frame
+
+        # Messages queued with Shift+F-key, in play order
+        self.queue_label = tk.Label(self.root, text="", font=("Arial", 9), fg="#555555")
+        self.queue_label.pack()
+
         stop_btn = tk.Button(
             control_frame,
             text="Stop",
@@ -270,24 +3240,323 @@ class VoiceKeyerTTS:
         )
         examples_btn.pack(side=tk.LEFT, padx=5)
 
-        if not RECORDING_AVAILABLE:
-            note = tk.Label(self.root,
-                            text="(Install sounddevice + soundfile for recording support)",
-                            font=("Arial", 8), fg="gray")
-            note.pack(pady=2)
+        self.process_all_button = tk.Button(
+            control_frame,
+            text="Process All",
+            command=self.process_all,
+            width=15,
+            state=tk.DISABLED
+        )
+        self.process_all_button.pack(side=tk.LEFT, padx=5)
+
+        self.clips_button = tk.Button(
+            control_frame,
+            text="Clips...",
+            command=self.show_clip_bank,
+            width=10,
+            state=tk.DISABLED
+        )
+        self.clips_button.pack(side=tk.LEFT, padx=5)
+
+        if LATENCY.enabled:
+            latency_btn = tk.Button(control_frame, text="Latency", command=self.show_latency_panel,
+                                    width=10)
+            latency_btn.pack(side=tk.LEFT, padx=5)
+        self.latency_window = None
+
+        # Shown by _on_audio_ready if the audio libraries are missing
+        self.recording_note = tk.Label(self.root,
+                                       text="(Install sounddevice + soundfile for recording support)",
+                                       font=("Arial", 8), fg="gray")
+
+    def show_latency_panel(self):
+        """Open (or raise) the window listing latency statistics per stage."""
+        if self.latency_window is not None:
+            self.latency_window.lift()
+            return
+        window = self.latency_window = tk.Toplevel(self.root)
+        window.title("Latency")
+        text = tk.Text(window, width=96, height=20, font=("Courier", 9))
+        text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        buttons = tk.Frame(window)
+        buttons.pack(pady=(0, 5))
+        tk.Button(buttons, text="Export...", width=10, command=self._export_latency).pack(side=tk.LEFT, padx=5)
+        tk.Button(buttons, text="Reset", width=10, command=LATENCY.reset).pack(side=tk.LEFT, padx=5)
+
+        def close():
+            self.latency_window = None
+            window.destroy()
+
+        def refresh():
+            if self.latency_window is not window:
+                return
+            text.delete("1.0", tk.END)
+            text.insert(tk.END, format_latency_summary(LATENCY.summary()))
+            window.after(1000, refresh)
+
+        window.protocol("WM_DELETE_WINDOW", close)
+        refresh()
+
+    def _export_latency(self):
+        path = filedialog.asksaveasfilename(
+            parent=self.latency_window, title="Export Latency", defaultextension=".json",
+            filetypes=[("JSON", "*.json"), ("CSV", "*.csv")])
+        if path:
+            try:
+                LATENCY.export(path)
+            except OSError as e:
+                messagebox.showerror("Export Failed", str(e))
+
+    def show_clip_bank(self):
+        """Open (or raise) the window for recording the clips Clips-mode slots are built from."""
+        if self.clips_window is not None:
+            self.clips_window.lift()
+            return
+        window = self.clips_window = tk.Toplevel(self.root)
+        window.title("Clip Bank")
+        tk.Label(window, font=("Arial", 9), fg="gray", justify=tk.LEFT,
+                 text="Record each word once. Slots in Clips mode say their text, e.g. "
+                      "\"{CALL} 59 {NR}\", by joining these clips.").grid(
+            row=0, column=0, columnspan=3, sticky=tk.W, padx=5, pady=5)
+        columns = 3
+        per_column = -(-len(CLIP_WORDS) // columns)
+        for i, name in enumerate(CLIP_WORDS):
+            key = CLIP_KEY_PREFIX + name
+            row = _SlotRow()
+            row.key = key
+            row.frame = tk.Frame(window)
+            row.frame.grid(row=1 + i % per_column, column=i // per_column, sticky=tk.W, padx=5, pady=1)
+            tk.Label(row.frame, text=name.title(), width=10, anchor=tk.W,
+                     font=("Arial", 9, "bold")).pack(side=tk.LEFT)
+            row.rec_label = tk.Label(row.frame, text="", font=("Arial", 8), width=14, anchor=tk.W)
+            row.rec_label.pack(side=tk.LEFT)
+            row.waveform = tk.Canvas(row.frame, width=WAVEFORM_BINS, height=20, bg="#f4f4f4",
+                                     highlightthickness=0)
+            row.waveform.pack(side=tk.LEFT, padx=2)
+            row.record_button = tk.Button(row.frame, text="Record", width=6, bg="#888888", fg="white",
+                                          command=lambda k=key: self._toggle_recording(k))
+            row.record_button.pack(side=tk.LEFT, padx=2)
+            row.play_button = tk.Button(row.frame, text="Play", width=6, bg="#4CAF50", fg="white",
+                                        command=lambda k=key: self._play_recording(k))
+            row.play_button.pack(side=tk.LEFT, padx=2)
+            self._clip_rows[key] = row
+            self._show_recording_info(row, self._recording_info(key))
+
+        def close():
+            if self.is_recording and self.recording_key in self._clip_rows:
+                self._stop_recording()
+            self._clip_rows = {}
+            self.clips_window = None
+            window.destroy()
+
+        window.protocol("WM_DELETE_WINDOW", close)
+
+    def _create_slot_row(self, parent):
+        """Build the widgets for one visible slot row; _bind_row attaches it to a slot."""
+        row = _SlotRow()
+        row.frame = tk.Frame(parent)
+
+        # Key label
+        row.key_label = tk.Label(row.frame, width=5, font=("Arial", 10, "bold"))
+        row.key_label.pack(side=tk.LEFT, padx=(5, 2))
+
+        # Mode toggle, disabled until the audio libraries have loaded (see _on_audio_ready)
+        row.mode_var = tk.StringVar(value="tts")
+        row.mode_frame = tk.Frame(row.frame)
+        row.mode_frame.pack(side=tk.LEFT, padx=2)
+        tts_rb = tk.Radiobutton(row.mode_frame, text="TTS", variable=row.mode_var, value="tts",
+                                command=lambda: self._on_mode_change(row.key), state=tk.DISABLED)
+        tts_rb.pack(side=tk.LEFT)
+        rec_rb = tk.Radiobutton(row.mode_frame, text="Rec", variable=row.mode_var, value="rec",
+                                command=lambda: self._on_mode_change(row.key), state=tk.DISABLED)
+        rec_rb.pack(side=tk.LEFT)
+        clips_rb = tk.Radiobutton(row.mode_frame, text="Clips", variable=row.mode_var, value="clips",
+                                  command=lambda: self._on_mode_change(row.key), state=tk.DISABLED)
+        clips_rb.pack(side=tk.LEFT)
+
+        # TTS frame (text entry)
+        row.tts_frame = tk.Frame(row.frame)
+        row.entry = tk.Entry(row.tts_frame, font=("Arial", 10))
+        row.entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        row.entry.bind('<FocusOut>', lambda e: self.save_message(row.key))
+        row.entry.bind('<Return>', lambda e: self._on_entry_return(row.key))
+
+        # Rec frame (recording info + record button)
+        row.rec_frame = tk.Frame(row.frame)
+        row.rec_label = tk.Label(row.rec_frame, text="Loading...", font=("Arial", 9), width=20, anchor=tk.W)
+        row.rec_label.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        row.waveform = tk.Canvas(row.rec_frame, width=WAVEFORM_BINS, height=20, bg="#f4f4f4",
+                                 highlightthickness=0)
+        row.waveform.pack(side=tk.LEFT, padx=2)
+        row.record_button = tk.Button(
+            row.rec_frame, text="Record", width=8,
+            command=lambda: self._toggle_recording(row.key),
+            bg="#888888", fg="white", state=tk.DISABLED
+        )
+        row.record_button.pack(side=tk.LEFT, padx=2)
+        row.fx_button = tk.Button(row.rec_frame, text="FX", width=3, state=tk.DISABLED,
+                                  command=lambda: self._edit_processing(row.key))
+        row.fx_button.pack(side=tk.LEFT, padx=2)
+
+        # Play button
+        row.play_button = tk.Button(
+            row.frame,
+            text="Play",
+            command=lambda: self.play_message(row.key),
+            bg="#4CAF50",
+            fg="white",
+            width=8
+        )
+        row.play_button.pack(side=tk.RIGHT, padx=5)
+        row.play_button.bind('<Shift-Button-1>', lambda e: self._on_queue_click(row.key))
+        return row
+
+    def _bind_row(self, row, key):
+        """Show slot key (or nothing, if None) in a row."""
+        row.key = key
+        if key is None:
+            row.frame.pack_forget()
+            return
+        row.frame.pack(fill=tk.X, pady=3)
+        row.key_label.config(text=f"{key}:")
+        row.entry.delete(0, tk.END)
+        row.entry.insert(0, self.message_slots.get(key, ""))
+        mode = self.slot_modes.get(key, "tts")
+        row.mode_var.set(mode)
+        self._show_mode_frame(key, mode)
+        if self.is_recording and key == self.recording_key:
+            row.record_button.config(text="Stop", bg="#f44336")
+            row.rec_label.config(text="Recording...")
+            row.waveform.delete("all")
+        else:
+            row.record_button.config(text="Record", bg="#888888")
+            if mode == "rec":
+                self._update_rec_label(key)
+        self._show_play_state(key)
+
+    def _refresh_rows(self):
+        """Re-bind the visible rows to the slots at the current scroll position."""
+        size = self.bank.size
+        self._first_row = max(0, min(self._first_row, size - VISIBLE_ROWS))
+        for i, row in enumerate(self._rows):
+            index = self._first_row + i
+            self._bind_row(row, f"F{index + 1}" if index < size else None)
+        if size > VISIBLE_ROWS:
+            self.slot_scrollbar.set(self._first_row / size, (self._first_row + VISIBLE_ROWS) / size)
+        else:
+            self.slot_scrollbar.set(0.0, 1.0)
+
+    def _scroll_to(self, first_row):
+        first_row = max(0, min(first_row, self.bank.size - VISIBLE_ROWS))
+        if first_row != self._first_row:
+            self._save_visible_rows()
+            self._first_row = first_row
+            self._refresh_rows()
+
+    def _on_scroll(self, action, amount, unit=None):
+        """Scrollbar command: ("moveto", fraction) or ("scroll", n, "units"/"pages")."""
+        if action == "moveto":
+            self._scroll_to(int(round(float(amount) * self.bank.size)))
+        elif action == "scroll":
+            step = VISIBLE_ROWS if unit == "pages" else 1
+            self._scroll_to(self._first_row + int(amount) * step)
+
+    def _on_mouse_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self._scroll_to(self._first_row - 1)
+        else:
+            self._scroll_to(self._first_row + 1)
+
+    def _row_for(self, key):
+        """Return the visible row bound to a slot of the active bank (or a clip), or None."""
+        if key in self._clip_rows:
+            return self._clip_rows[key]
+        for row in self._rows:
+            if row.key == key:
+                return row
+        return None
+
+    def _save_visible_rows(self):
+        for row in self._rows:
+            if row.key is not None:
+                self.save_message(row.key)
+
+    def switch_bank(self, name):
+        """Make another bank active; only the visible rows are re-bound."""
+        if name not in self.bank_names or name == self.bank.name:
+            return
+        if self.is_recording:
+            self._stop_recording()
+        self._save_visible_rows()
+        self.bank = self._get_bank(name)
+        self.bank.raw_recording_path("F1").parent.mkdir(parents=True, exist_ok=True)
+        self.bank_var.set(name)
+        self._first_row = 0
+        self._refresh_rows()
+        if self.recording_bank is not None:
+            threading.Thread(target=self._load_bank_recordings, args=(self.bank,),
+                             daemon=True).start()
+        if self._voice_known:
+            self._prerender_all()
+        self._prestretch_all()
+        self.save_config()
+
+    def _load_bank_recordings(self, bank):
+        """Migrate and load a bank's recordings; re-label the rows if old WAVs were moved in."""
+        if bank.archive.migrate():
+            self.root.after(0, self._refresh_rows)
+        self.recording_bank.load_all(bank.archive)
+
+    def _switch_bank_number(self, number):
+        if number <= len(self.bank_names):
+            self.switch_bank(self.bank_names[number - 1])
+
+    def new_bank(self):
+        """Ask for a name and create an empty bank."""
+        name = simpledialog.askstring("New Bank", "Name for the new message bank:", parent=self.root)
+        name = (name or "").strip()
+        if not name:
+            return
+        if name in self.bank_names:
+            messagebox.showwarning("New Bank", f"A bank named {name} already exists")
+            return
+        # Names differing only in characters a file name can't hold (or in case) share a file
+        file_name = _bank_file_name(name)
+        clash = next((other for other in self.bank_names
+                      if _bank_file_name(other).casefold() == file_name.casefold()), None)
+        if clash is not None or MessageBank(name).path.exists():
+            owner = f"bank {clash}" if clash is not None else "an existing bank file"
+            messagebox.showwarning("New Bank", f"{name} would be stored as {file_name}.json, "
+                                               f"which {owner} already uses; choose another name")
+            return
+        self.bank_names.append(name)
+        self.bank_combo.config(values=self.bank_names)
+        self._get_bank(name).save()
+        self.switch_bank(name)
+
+    def add_slot(self):
+        """Append an empty slot to the active bank and scroll to it."""
+        self._save_visible_rows()
+        self.bank.size += 1
+        self.bank.save()
+        self._first_row = self.bank.size
+        self._refresh_rows()
 
     def _show_mode_frame(self, key, mode):
-        """Show the correct sub-frame (TTS or Rec) for a slot."""
-        if mode == "tts":
-            self.rec_frames[key].pack_forget()
-            self.tts_frames[key].pack(side=tk.LEFT, fill=tk.X, expand=True)
+        """Show the correct sub-frame (TTS or Rec) for a slot; Clips slots use the text entry."""
+        row = self._row_for(key)
+        if row is None:
+            return
+        if mode in ("tts", "clips"):
+            row.rec_frame.pack_forget()
+            row.tts_frame.pack(side=tk.LEFT, fill=tk.X, expand=True)
         else:
-            self.tts_frames[key].pack_forget()
-            self.rec_frames[key].pack(side=tk.LEFT, fill=tk.X, expand=True)
+            row.tts_frame.pack_forget()
+            row.rec_frame.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
     def _on_mode_change(self, key):
         """Handle mode toggle for a slot."""
-        mode = self.mode_vars[key].get()
+        mode = self._row_for(key).mode_var.get()
         self.slot_modes[key] = mode
         self._show_mode_frame(key, mode)
         self._update_rec_label(key)
@@ -295,20 +3564,23 @@ class VoiceKeyerTTS:
 
     def _update_rec_label(self, key):
         """Update the recording info label for a slot."""
-        if key not in self.rec_labels:
+        row = self._row_for(key)
+        if row is None or not RECORDING_AVAILABLE:
             return
-        if self._has_recording(key):
-            dur = self._recording_duration(key)
-            if dur is not None:
-                self.rec_labels[key].config(text=f"Recorded ({dur:.1f}s)")
-            else:
-                self.rec_labels[key].config(text="Recorded")
-        else:
-            self.rec_labels[key].config(text="No recording")
+        self._show_recording_info(row, self._recording_info(key))
 
-    def _update_all_rec_labels(self):
-        for i in range(1, 9):
-            self._update_rec_label(f"F{i}")
+    def _show_recording_info(self, row, info):
+        """Show a recording's length and waveform thumbnail from its index entry."""
+        row.rec_label.config(text=self._rec_label_text(info))
+        canvas = row.waveform
+        canvas.delete("all")
+        if not info:
+            return
+        height = int(canvas["height"])
+        mid = height / 2
+        color = "#f44336" if info["peak"] >= 0.99 else "#4a7bd0"
+        for x, (lo, hi) in enumerate(zip(info["min"], info["max"])):
+            canvas.create_line(x, mid - hi * mid, x, mid - lo * mid + 1, fill=color)
 
     def _toggle_recording(self, key):
         """Start or stop recording for a slot."""
@@ -320,20 +3592,260 @@ class VoiceKeyerTTS:
                 self._stop_recording()
             return
 
-        # Start recording
+        if self.vad and self.input_monitor is not None:
+            # Voice-activated: wait for the first syllable; the pre-roll keeps its onset
+            self.is_recording = True
+            self.recording_key = key
+            self._armed_at = self.input_monitor.ring.write_pos
+            row = self._row_for(key)
+            if row is not None:
+                row.record_button.config(text="Cancel", bg="#ff9800")
+                row.rec_label.config(text="Waiting for voice...")
+            self.root.after(METER_INTERVAL_MS, self._poll_voice)
+            return
+        self._start_recorder(key)
+
+    def _start_recorder(self, key, preroll=None):
+        """Start recording a slot's raw take; it is processed into the archive on stop."""
+        path = self._raw_recording_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        monitor = self.input_monitor
+        if monitor is not None:
+            # Take the audio from the open input, starting with what it just heard
+            samplerate = monitor.samplerate
+            preroll = self.preroll if preroll is None else preroll
+        else:
+            # Record at the output device's rate so the take plays without conversion
+            samplerate = input_samplerate(self.playback.samplerate)
+        self.recorder = StreamingRecorder(
+            path, samplerate=samplerate, max_seconds=self._get_max_record_seconds(),
+            on_limit=lambda: self.root.after(0, self._stop_recording),
+            source=monitor, preroll=preroll or 0.0)
+        try:
+            self.recorder.start()
+        except Exception as e:
+            print(f"Error starting recording: {e}")
+            self.recorder = None
+            self.is_recording = False
+            self.recording_key = None
+            self._update_rec_label(key)
+            return
+
         self.is_recording = True
         self.recording_key = key
-        self.recorded_data = []
-        self.record_buttons[key].config(text="Stop", bg="#f44336")
-        self.rec_labels[key].config(text="Recording...")
+        row = self._row_for(key)
+        if row is not None:
+            row.record_button.config(text="Stop", bg="#f44336")
+            row.rec_label.config(text="Recording...")
+            row.waveform.delete("all")
+        self._show_meter(None)
+        self.clip_label.config(bg="#888888")
+        self.meter_frame.pack(pady=2, before=self._meter_before)
+        self.root.after(METER_INTERVAL_MS, self._poll_meter)
+
+    def _poll_voice(self):
+        """Start a voice-activated take on voice, and stop it after VAD_HANGOVER of silence."""
+        monitor = self.input_monitor
+        if not self.is_recording or monitor is None:
+            return
+        if self.recorder is None:
+            if monitor.voice_pos > self._armed_at:
+                self._start_recorder(self.recording_key, max(self.preroll, VAD_PREROLL))
+        elif monitor.silence >= VAD_HANGOVER:
+            self._stop_recording()
+            return
+        self.root.after(METER_INTERVAL_MS, self._poll_voice)
+
+    def _on_input_change(self):
+        """Apply edited pre-roll and voice activation settings."""
+        try:
+            self.preroll = min(max(0.0, self.preroll_var.get()), PREROLL_MAX_SECONDS)
+        except tk.TclError:
+            pass
+        self.vad = self.vad_var.get()
+        self._apply_input_monitor()
+        self.save_config()
+
+    def _apply_input_monitor(self):
+        """Keep the input open while pre-roll or voice activation is on, and only then."""
+        if not RECORDING_AVAILABLE or self.playback is None or self.is_recording:
+            return  # re-applied when the take ends
+        wanted = self.preroll > 0 or self.vad
+        if wanted and self.input_monitor is None:
+            monitor = InputMonitor(input_samplerate(self.playback.samplerate))
+            try:
+                monitor.start()
+            except Exception as e:
+                print(f"Error opening input: {e}")
+                return
+            self.input_monitor = monitor
+        elif not wanted and self.input_monitor is not None:
+            self._close_input_monitor()
+
+    def _close_input_monitor(self):
+        if self.input_monitor is not None:
+            try:
+                self.input_monitor.close()
+            except Exception as e:
+                print(f"Error closing input: {e}")
+            self.input_monitor = None
+
+    def _on_dvr_change(self):
+        """Apply edited receive recorder settings."""
+        try:
+            self.dvr_minutes = min(max(0, self.dvr_minutes_var.get()), DVR_MAX_MINUTES)
+        except tk.TclError:
+            pass
+        self.dvr_input = self.dvr_input_var.get().strip()
+        if self.dvr_output_var.get().strip() != self.dvr_output:
+            self.dvr_output = self.dvr_output_var.get().strip()
+            self._close_replay()  # reopened on the new device by the next replay
+        self._apply_dvr()
+        self.save_config()
+
+    def _apply_dvr(self):
+        """Open, resize or close the receive recorder to match the settings."""
+        if not RECORDING_AVAILABLE or self.playback is None:
+            return
+        wanted = (self.dvr_minutes, self.dvr_input) if self.dvr_minutes > 0 else None
+        if wanted == self._dvr_opened:
+            return
+        self._close_dvr()
+        if wanted is not None:
+            device = device_arg(self.dvr_input)
+            # The whole buffer is allocated here, never while recording
+            dvr = InputMonitor(input_samplerate(DVR_SAMPLERATE, device),
+                               seconds=self.dvr_minutes * 60, threshold_db=None, device=device)
+            try:
+                dvr.start()
+            except Exception as e:
+                print(f"Error opening receive input: {e}")
+                self.dvr_label.config(text="Input not available")
+                return
+            self.dvr = dvr
+            self._dvr_opened = wanted
+        self._show_dvr_status()
+
+    def _close_dvr(self):
+        if self.dvr is not None:
+            try:
+                self.dvr.close()
+            except Exception as e:
+                print(f"Error closing receive input: {e}")
+        self.dvr = None
+        self._dvr_opened = None
+
+    def _close_replay(self):
+        if self.replay is not None:
+            self.replay.close()
+            self.replay = None
+
+    def _show_dvr_status(self):
+        dvr = self.dvr
+        if dvr is None:
+            self.dvr_label.config(text="Off")
+            return
+        self.dvr_label.config(text=f"{self.dvr_minutes} min at {dvr.samplerate / 1000:g} kHz, "
+                                   f"{dvr.memory_bytes / (1024 * 1024):.1f} MB")
+
+    def replay_last(self, seconds):
+        """Play the last seconds of receive audio on the replay output."""
+        dvr = self.dvr
+        if dvr is None:
+            self.dvr_label.config(text="Off: set Keep (min) to record receive audio")
+            return "break"
+        device = device_arg(self.dvr_output)
+        if is_transmit_output(device):
+            # Received audio on the transmit output would go on the air (and key VOX)
+            self._warn("Replay Output", "Set Replay out to an output other than the one messages "
+                                        "are transmitted on, e.g. your headphones.")
+            return "break"
+        data = dvr.ring.latest(int(seconds * dvr.samplerate))
+        if not len(data):
+            return "break"
+        try:
+            if self.replay is None:
+                self.replay = PlaybackEngine(samplerate=output_samplerate(device=device),
+                                             device=device)
+            self.replay.play(data, dvr.samplerate, tag="replay")
+        except Exception as e:
+            print(f"Error replaying receive audio: {e}")
+            self._close_replay()
+        return "break"  # F10 would otherwise open the menu bar on Windows
+
+    def stop_replay(self):
+        if self.replay is not None:
+            self.replay.stop()
+
+    def export_dvr(self):
+        """Save everything the receive recorder holds to a WAV or FLAC file."""
+        dvr = self.dvr
+        if dvr is None:
+            self.dvr_label.config(text="Off: set Keep (min) to record receive audio")
+            return
+        data = dvr.ring.latest(len(dvr.ring.data))
+        path = filedialog.asksaveasfilename(
+            parent=self.root, title="Export Receive Audio", defaultextension=".wav",
+            initialfile=time.strftime("rx-%Y%m%d-%H%M%S.wav"),
+            filetypes=[("WAV", "*.wav"), ("FLAC", "*.flac")])
+        if not path:
+            return
+        samplerate = dvr.samplerate
+
+        def work():
+            try:
+                sf.write(path, data, samplerate)
+            except Exception as e:
+                print(f"Error exporting receive audio: {e}")
+                message = str(e)
+                self.root.after(0, lambda: messagebox.showerror("Export Failed", message))
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def _poll_meter(self):
+        """Update the level meter from the recorder's block statistics while recording."""
+        if not self.is_recording or self.recorder is None:
+            self.meter_frame.pack_forget()
+            return
+        levels = self.recorder.read_levels()
+        if levels is not None:
+            self._show_meter(levels)
+        if self.recorder.clipped:
+            self.clip_label.config(bg="#f44336")
+        self.root.after(METER_INTERVAL_MS, self._poll_meter)
 
-        samplerate = 44100
+    def _show_meter(self, levels):
+        peak, rms = levels if levels is not None else (0.0, 0.0)
+        peak_db, rms_db = (20 * math.log10(max(v, 1e-6)) for v in (peak, rms))
+        width = int(self.meter_canvas["width"])
 
-        def callback(indata, frames, time_info, status):
-            self.recorded_data.append(indata.copy())
+        def x(db):
+            return int(width * (max(db, METER_FLOOR_DB) - METER_FLOOR_DB) / -METER_FLOOR_DB)
 
-        self._rec_stream = sd.InputStream(samplerate=samplerate, channels=1, callback=callback)
-        self._rec_stream.start()
+        self.meter_canvas.coords(self.meter_rms, 0, 0, x(rms_db), 12)
+        self.meter_canvas.coords(self.meter_peak, x(peak_db), 0, x(peak_db), 12)
+        if levels is None or peak_db <= METER_FLOOR_DB:
+            self.meter_label.config(text="")
+        else:
+            self.meter_label.config(text=f"pk {peak_db:.0f} / rms {rms_db:.0f} dB")
+
+    def _on_ptt_change(self):
+        """Apply edited PTT settings (port, line, lead and tail)."""
+        self.ptt_port = self.ptt_port_var.get().strip()
+        self.ptt_line = self.ptt_line_var.get()
+        try:
+            self.ptt_lead = max(0.0, self.ptt_lead_var.get())
+            self.ptt_tail = max(0.0, self.ptt_tail_var.get())
+        except tk.TclError:
+            pass
+        self._apply_ptt()
+        self.save_config()
+
+    def _get_max_record_seconds(self):
+        try:
+            return max(1, self.max_record_var.get())
+        except tk.TclError:
+            return RECORDING_MAX_SECONDS
 
     def _stop_recording(self):
         """Stop the current recording and save to file."""
@@ -341,140 +3853,245 @@ class VoiceKeyerTTS:
             return
 
         key = self.recording_key
-        self._rec_stream.stop()
-        self._rec_stream.close()
-
-        if self.recorded_data:
-            data = np.concatenate(self.recorded_data, axis=0)
-            path = self._recording_path(key)
-            sf.write(str(path), data, 44100)
+        if self.recorder is None:
+            # A voice-activated take cancelled before any voice was heard
+            self.is_recording = False
+            self.recording_key = None
+            row = self._row_for(key)
+            if row is not None:
+                row.record_button.config(text="Record", bg="#888888")
+            self._update_rec_label(key)
+            self._apply_input_monitor()
+            return
+        start = LATENCY.now()
+        try:
+            path = self.recorder.stop()
+        except Exception as e:
+            print(f"Error saving recording: {e}")
+            path = None
+        LATENCY.since("stop recording", start)
 
         self.is_recording = False
         self.recording_key = None
-        self.recorded_data = []
+        self.recorder = None
 
-        self.record_buttons[key].config(text="Record", bg="#888888")
-        self._update_rec_label(key)
+        row = self._row_for(key)
+        if row is not None:
+            row.record_button.config(text="Record", bg="#888888")
+        if path is not None:
+            self._process_slot(key)
+        else:
+            self._update_rec_label(key)
+        self._apply_input_monitor()
+
+    def _processing_options(self, key):
+        return dict(DEFAULT_PROCESSING, **self.slot_processing.get(key, {}))
+
+    def _process_slot(self, key):
+        """Process a slot's raw take in the background and load the result."""
+        raw_path = self._raw_recording_path(key)
+        archive, name = self._archive_for(key)
+        if not raw_path.exists():
+            if not self._has_recording(key):
+                return
+            # Recorded before processing existed: keep the original as the raw take
+            save_raw_take(archive, name, raw_path)
+        options = self._processing_options(key)
+        row = self._row_for(key)
+        if row is not None:
+            row.rec_label.config(text="Processing...")
+
+        def work():
+            start = LATENCY.now()
+            try:
+                process_recording(raw_path, archive, name, options)
+                # Convert the result now if needed, so the next play has it ready
+                self._prepare_recording(key)
+            except Exception as e:
+                print(f"Error processing recording: {e}")
+            LATENCY.since("process recording", start)
+            self.root.after(0, lambda: self._update_rec_label(key))
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def process_all(self):
+        """Re-run post-processing over the recordings of every bank with each slot's settings."""
+        if not RECORDING_AVAILABLE:
+            return
+        banks = [self._get_bank(name) for name in self.bank_names]
+
+        def work():
+            for bank in banks:
+                if not bank.recordings_dir.exists():
+                    continue
+                options_for = lambda key, b=bank: dict(DEFAULT_PROCESSING, **b.processing.get(key, {}))
+                for key in process_all_recordings(bank.archive, options_for):
+                    self.recording_bank.get(bank.archive, key)
+            for name in process_all_recordings(self.clip_bank.archive):
+                self.clip_bank.prepare(name)
+            self.root.after(0, self._refresh_rows)
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def _edit_processing(self, key):
+        """Open a small dialog to change a slot's post-processing steps."""
+        options = self._processing_options(key)
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"{key} Processing")
+        dialog.transient(self.root)
+        dialog.resizable(False, False)
+
+        flags = {}
+        for row, (name, label) in enumerate([("highpass", "Remove DC / rumble"),
+                                             ("trim", "Trim silence"),
+                                             ("compress", "Compress")]):
+            flags[name] = tk.BooleanVar(value=options[name])
+            tk.Checkbutton(dialog, text=label, variable=flags[name]).grid(
+                row=row, column=0, columnspan=2, sticky=tk.W, padx=10, pady=2)
+        tk.Label(dialog, text="Normalize:").grid(row=3, column=0, sticky=tk.W, padx=10, pady=2)
+        normalize_var = tk.StringVar(value=options["normalize"])
+        tk.OptionMenu(dialog, normalize_var, *NORMALIZE_MODES).grid(row=3, column=1, sticky=tk.W, pady=2)
+
+        def apply():
+            self.slot_processing[key] = dict({name: var.get() for name, var in flags.items()},
+                                             normalize=normalize_var.get())
+            self.save_config()
+            dialog.destroy()
+            self._process_slot(key)
+
+        tk.Button(dialog, text="Apply", width=10, command=apply).grid(row=4, column=0, columnspan=2, pady=8)
 
     def bind_shortcuts(self):
-        """Bind F1-F8 keys to speak messages"""
+        """Bind F1-F8 keys to speak messages of the active bank, Ctrl+1-9 to switch banks"""
         for i in range(1, 9):
             self.root.bind(f"<F{i}>", lambda e, k=f"F{i}": self.play_message(k))
+            self.root.bind(f"<Shift-F{i}>", lambda e, k=f"F{i}": self.queue_message(k))
+        for i in range(1, 10):
+            self.root.bind(f"<Control-Key-{i}>", lambda e, n=i: self._switch_bank_number(n))
+
+        # Mouse wheel scrolls the slot list
+        self.slots_frame.bind_all("<MouseWheel>", self._on_mouse_wheel)
+        self.slots_frame.bind_all("<Button-4>", self._on_mouse_wheel)
+        self.slots_frame.bind_all("<Button-5>", self._on_mouse_wheel)
+
+        # F9-F11 replay the last 5/10/30 s of receive audio
+        for seconds, key in zip(DVR_REPLAY_SECONDS, ("F9", "F10", "F11")):
+            self.root.bind(f"<{key}>", lambda e, s=seconds: self.replay_last(s))
 
         # ESC to stop
         self.root.bind("<Escape>", lambda e: self.stop_speech())
 
+        # Any other key aborts auto-repeat
+        self.root.bind("<Key>", self._on_any_key)
+
+    def _on_queue_click(self, key):
+        self.queue_message(key)
+        return "break"  # Don't also run the button's play command
+
+    def _on_entry_return(self, key):
+        self.play_message(key)
+        return "break"  # Don't let the root <Key> binding abort a repeat just started
+
     def save_message(self, key):
         """Save message text from entry field"""
-        text = self.text_entries[key].get().strip()
+        row = self._row_for(key)
+        if row is None:
+            return
+        text = row.entry.get().strip()
+        changed = text != self.message_slots.get(key, "")
         if text:
             self.message_slots[key] = text
         elif key in self.message_slots:
             del self.message_slots[key]
-        self.save_config()
+        if changed:
+            self._prerender_slot(key)
+            self.save_config()
 
     def play_message(self, key):
-        """Play the message assigned to key (TTS or recording)."""
-        mode = self.mode_vars[key].get() if key in self.mode_vars else "tts"
-
-        if mode == "rec" and RECORDING_AVAILABLE:
-            self._play_recording(key)
-        else:
-            self._play_tts(key)
-
-    def _play_tts(self, key):
-        """Speak the TTS message for a key."""
-        self.save_message(key)
-        text = self.text_entries[key].get().strip()
-
-        if not text:
-            messagebox.showwarning("No Message", f"No message entered for {key}")
+        """Play the message assigned to key, saving the slot's entry text first."""
+        if not self.audio_ready:
+            # Key pressed during startup: play once the audio libraries are loaded
+            self.root.after(50, lambda: self.play_message(key))
             return
+        requested_at = LATENCY.now()  # before saving, which is part of the key's latency
+        self.save_message(key)
+        super().play_message(key, requested_at)
 
-        if self.is_playing:
+    def queue_message(self, key):
+        """Chain the message after the one playing, saving the slot's entry text first."""
+        if not self.audio_ready:
+            self.root.after(50, lambda: self.queue_message(key))
             return
+        requested_at = LATENCY.now()
+        self.save_message(key)
+        super().queue_message(key, requested_at)
 
-        self.play_buttons[key].config(bg="#FFA500", text="Playing")
-
-        def speak():
-            try:
-                self.is_playing = True
-                engine = self._create_engine()
-                engine.say(text)
-                engine.runAndWait()
-                engine.stop()
-                del engine
-            except Exception as e:
-                print(f"Error speaking: {e}")
-            finally:
-                self.is_playing = False
-                self.root.after(0, lambda: self.play_buttons[key].config(bg="#4CAF50", text="Play"))
+    def _queue_changed(self):
+        text = "Queued: " + " \u2192 ".join(self.queued) if self.queued else ""
+        self.queue_label.config(text=text)
 
-        thread = threading.Thread(target=speak, daemon=True)
-        thread.start()
+    def _repeat_settings(self):
+        """Return (count, gap) for play_message; count None repeats until stopped."""
+        if not self.repeat_var.get():
+            return 1, 0.0
+        gap, count = self._repeat_values()
+        return (count if count > 0 else None), gap
 
-    def _play_recording(self, key):
-        """Play a recorded WAV file for a key."""
-        path = self._recording_path(key)
-        if not path.exists():
-            messagebox.showwarning("No Recording", f"No recording saved for {key}")
-            return
+    def _repeat_values(self):
+        """Return the (gap, count) spinbox values, falling back to the last valid ones."""
+        try:
+            self._repeat_gap = max(0.0, self.repeat_gap_var.get())
+            self._repeat_count = max(0, self.repeat_count_var.get())
+        except tk.TclError:
+            pass
+        return self._repeat_gap, self._repeat_count
 
-        if self.is_playing:
-            return
+    def _on_any_key(self, event):
+        """Any keypress aborts a running auto-repeat."""
+        if self._repeating:
+            self.stop_speech()
 
-        self.play_buttons[key].config(bg="#FFA500", text="Playing")
+    def _mark_playing(self, tag, play_id):
+        previous = self.playing_tag
+        super()._mark_playing(tag, play_id)
+        if previous != tag:
+            self._show_play_state(previous)  # pre-empted; its own event no longer matches
+        self._show_play_state(tag)
 
-        def play():
-            try:
-                self.is_playing = True
-                data, samplerate = sf.read(str(path))
-                sd.play(data, samplerate)
-                sd.wait()
-            except Exception as e:
-                print(f"Error playing recording: {e}")
-            finally:
-                self.is_playing = False
-                self.root.after(0, lambda: self.play_buttons[key].config(bg="#4CAF50", text="Play"))
+    def _mark_idle(self, play_id):
+        tag = self.playing_tag
+        if not super()._mark_idle(play_id):
+            return False
+        self._show_play_state(tag)
+        return True
 
-        thread = threading.Thread(target=play, daemon=True)
-        thread.start()
+    def _show_play_state(self, key):
+        """Show in key's row (if visible) whether its message is playing."""
+        row = self._row_for(key) if key is not None else None
+        if row is None:
+            return
+        if key == self.playing_tag:
+            row.play_button.config(bg="#FFA500", text="Playing")
+        else:
+            row.play_button.config(bg="#4CAF50", text="Play")
 
     def stop_speech(self):
-        """Stop currently playing speech - resets flag so next play works"""
-        self.is_playing = False
-        if RECORDING_AVAILABLE:
-            try:
-                sd.stop()
-            except Exception:
-                pass
+        """Stop playback, replays and any recording in progress"""
+        super().stop_speech()
+        self.stop_replay()
         if self.is_recording:
             self._stop_recording()
-        for btn in self.play_buttons.values():
-            btn.config(bg="#4CAF50", text="Play")
+        for row in self._rows:
+            row.play_button.config(bg="#4CAF50", text="Play")
 
     def test_voice(self):
         """Test the current voice settings"""
-        if self.is_playing:
-            return
-
         test_text = "CQ CQ CQ, this is Whiskey One Alpha Bravo Charlie, calling CQ and standing by."
 
-        def speak():
-            try:
-                self.is_playing = True
-                engine = self._create_engine()
-                engine.say(test_text)
-                engine.runAndWait()
-                engine.stop()
-                del engine
-            except Exception as e:
-                print(f"Error in test: {e}")
-            finally:
-                self.is_playing = False
-
-        thread = threading.Thread(target=speak, daemon=True)
-        thread.start()
+        if self.playback is None:
+            self._speak_live(test_text, None)
+        else:
+            self._play_text(test_text, None)
 
     def load_examples(self):
         """Load example messages for amateur radio"""
@@ -492,73 +4109,401 @@ class VoiceKeyerTTS:
         if messagebox.askyesno("Load Examples",
                                "This will replace all current messages with examples. Continue?"):
             for key, text in examples.items():
-                self.text_entries[key].delete(0, tk.END)
-                self.text_entries[key].insert(0, text)
                 self.message_slots[key] = text
-                if key in self.mode_vars:
-                    self.mode_vars[key].set("tts")
-                    self.slot_modes[key] = "tts"
-                    self._show_mode_frame(key, "tts")
+                self.slot_modes[key] = "tts"
+                self._prerender_slot(key)
+            self._refresh_rows()
             self.save_config()
 
     def clear_all(self):
         """Clear all messages"""
         if messagebox.askyesno("Clear All", "Remove all message assignments?"):
             self.message_slots.clear()
-            for entry in self.text_entries.values():
-                entry.delete(0, tk.END)
+            for key in self.bank.keys():
+                self._prerender_slot(key)
+            self._refresh_rows()
             self.save_config()
 
+    def on_close(self):
+        """Write any pending config before the window closes."""
+        self._save_visible_rows()
+        self.save_config()
+        self._close_input_monitor()
+        self._close_dvr()
+        self._close_replay()
+        self.close()
+        self.root.destroy()
+
     def save_config(self):
-        """Save configuration to file"""
+        """Save configuration to file, taking the current values from the widgets"""
+        self._speed = self.speed_var.get()
+        self._volume = self.volume_var.get()
+        self._max_record_seconds = self._get_max_record_seconds()
+        self._repeat_values()
         try:
-            # Build per-slot config with mode info
-            messages = {}
-            for i in range(1, 9):
-                key = f"F{i}"
-                mode = self.slot_modes.get(key, "tts")
-                text = self.message_slots.get(key, "")
-                messages[key] = {"mode": mode, "text": text}
+            self.chain_gap = max(0.0, self.chain_gap_var.get())
+        except tk.TclError:
+            pass
+        super().save_config()
 
-            config = {
-                'messages': messages,
-                'speed': self.speed_var.get(),
-                'volume': self.volume_var.get()
-            }
-            with open(self.config_file, 'w') as f:
-                json.dump(config, f, indent=2)
-        except Exception as e:
-            print(f"Error saving config: {e}")
 
-    def load_config(self):
-        """Load configuration from file"""
+class KeyerDaemon(KeyerCore):
+    """Headless keyer driven by one-line commands on a local datagram socket.
+
+    Commands and replies:
+        PLAY <slot>           play a slot of the active bank -> OK / ERR <reason>
+        QUEUE <slot>          chain a slot after the current -> OK / ERR <reason>
+        STOP                  stop playback                  -> OK
+        MACRO <name> [value]  set (or clear) a macro value   -> OK / ERR <reason>
+        STATUS                                               -> JSON object
+        LATENCY               latency statistics (--latency) -> JSON object
+    address is a (host, port) tuple for UDP or a path for a Unix socket.
+    Commands run on the socket thread as they arrive; callbacks from the TTS
+    and audio threads run between datagrams.
+    """
+
+    def __init__(self, address=DAEMON_ADDRESS, fake_audio=False):
+        self._pending = queue.SimpleQueue()
+        super().__init__()
+        self.address = address
+        self.fake_audio = fake_audio
+        self.sock = None
+        self._running = False
+
+    def _call_soon(self, callback):
+        self._pending.put(callback)
+
+    def start(self):
+        """Load the audio libraries and bind the command socket."""
+        if load_audio_libraries(need_device=not self.fake_audio):
+            self._start_audio(FakeOutputStream if self.fake_audio else None)
+        self.audio_ready = True
+        if isinstance(self.address, str):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            if os.path.exists(self.address):
+                os.unlink(self.address)  # left over from a daemon that was killed
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(self.address)
+        self.sock.settimeout(0.1)
+
+    def serve_forever(self):
+        """Handle commands until shutdown() is called from another thread."""
+        self._running = True
+        try:
+            while self._running:
+                try:
+                    data, peer = self.sock.recvfrom(4096)
+                except socket.timeout:
+                    data = None
+                if data is not None:  # an empty datagram still gets its "ERR empty command"
+                    reply = self.handle_command(data.decode("utf-8", "replace"))
+                    if peer:
+                        self.sock.sendto(reply.encode("utf-8"), peer)
+                self._run_pending()
+        finally:
+            self.sock.close()
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.unlink(self.address)
+            self.close()
+
+    def shutdown(self):
+        self._running = False
+
+    def _run_pending(self):
+        while True:
+            try:
+                callback = self._pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in daemon callback: {e}")
+
+    def handle_command(self, line):
+        """Run one command line and return the reply text."""
+        parts = line.strip().split(None, 2)
+        if not parts:
+            return "ERR empty command"
+        command = parts[0].upper()
         try:
-            if self.config_file.exists():
-                with open(self.config_file, 'r') as f:
-                    config = json.load(f)
-                    raw_messages = config.get('messages', {})
-                    # Support both old format (string) and new format (dict with mode/text)
-                    for key, val in raw_messages.items():
-                        if isinstance(val, dict):
-                            self.message_slots[key] = val.get("text", "")
-                            self.slot_modes[key] = val.get("mode", "tts")
-                        else:
-                            # Old format: plain string
-                            self.message_slots[key] = val
-                            self.slot_modes[key] = "tts"
-                    if 'speed' in config:
-                        self.speed_var = tk.IntVar(value=config['speed'])
-                    if 'volume' in config:
-                        self.volume_var = tk.DoubleVar(value=config['volume'])
+            if command in ("PLAY", "QUEUE") and len(parts) == 2:
+                key = parts[1].upper()
+                if key not in self.bank.keys():
+                    return f"ERR unknown slot: {key}"
+                play = self.play_message if command == "PLAY" else self.queue_message
+                return "OK" if play(key) else f"ERR nothing to play for {key}"
+            if command == "STOP" and len(parts) == 1:
+                self.stop_speech()
+                return "OK"
+            if command == "MACRO" and len(parts) >= 2:
+                self.set_macro(parts[1], parts[2] if len(parts) == 3 else "")
+                return "OK"
+            if command == "STATUS" and len(parts) == 1:
+                return json.dumps(self.status())
+            if command == "LATENCY" and len(parts) == 1:
+                return json.dumps(LATENCY.summary())
         except Exception as e:
-            print(f"Error loading config: {e}")
-            self.message_slots = {}
+            return f"ERR {e}"
+        return f"ERR unknown command: {line.strip()}"
+
+    def status(self):
+        if self.playback is not None:
+            playing = self.playback.state != PlaybackEngine.IDLE
+        else:
+            playing = self.playing_tag is not None
+        return {
+            'state': "playing" if playing else "idle",
+            'slot': self.playing_tag if playing else None,
+            'queue': self.queued,
+            'bank': self.bank.name,
+            'slots': self.bank.size,
+            'macros': self.macro_values,
+            'audio': "none" if self.playback is None else ("fake" if self.fake_audio else "device"),
+            'tts': {kind: {'count': count, 'wait_ms': round(wait * 1000, 1), 'run_ms': round(run * 1000, 1)}
+                    for kind, (count, wait, run) in self.tts.timing_summary().items()},
+        }
+
+
+def send_command(command, address=DAEMON_ADDRESS, timeout=1.0):
+    """Send one command to a running daemon and return its reply."""
+    reply_path = None
+    if isinstance(address, str):
+        # A Unix datagram client needs its own address to receive the reply
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        reply_path = os.path.join(tempfile.gettempdir(),
+                                  f"voice_keyer_client_{os.getpid()}_{threading.get_ident()}")
+        if os.path.exists(reply_path):
+            os.unlink(reply_path)
+        sock.bind(reply_path)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.settimeout(timeout)
+        sock.sendto(command.encode("utf-8"), address)
+        return sock.recv(65536).decode("utf-8")
+    finally:
+        sock.close()
+        if reply_path is not None:
+            os.unlink(reply_path)
+
+
+_worker_tts = None
+
+
+def _init_render_worker():
+    """Process pool initializer: one TTS engine per worker process."""
+    global _worker_tts
+    load_audio_libraries(need_device=False)
+    _worker_tts = TTSService()
+
+
+def _render_in_worker(text, path, voice_id, rate, volume):
+    """Render text to path in a pool worker; return the audio duration in seconds."""
+    path = Path(path)
+    tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.wav")
+    job = _worker_tts.render_to_file(text, tmp_path, voice=voice_id, rate=rate, volume=volume)
+    job.future.result()
+    os.replace(tmp_path, path)
+    return sf.info(str(path)).duration
+
+
+def render_library(bank_names=None, out_dir=None, fmt="wav", jobs=None, force=False):
+    """Render the TTS slots of the given banks (default: all) on a process pool.
+
+    Renders go into the TTS cache, where the keyer plays them without any
+    synthesis delay, and texts already cached are skipped. Templates are
+    rendered the way the keyer plays them: static fragments plus macro
+    values. With out_dir every slot is also written, macros expanded, to
+    out_dir/<bank>/<slot>.<fmt> (recording slots from the bank's archive)
+    at the configured Speed; files whose message has not changed since the
+    last export are left alone. Returns the number of failed renders.
+    """
+    config = ConfigStore(CONFIG_FILE).load()
+    names = [DEFAULT_BANK] + [name for name in config.get('banks', []) if name != DEFAULT_BANK]
+    if bank_names:
+        for name in bank_names:
+            if name not in names:
+                print(f"Unknown bank: {name}")
+        names = [name for name in names if name in bank_names]
+    settings = (config.get('voice_id') or None, TTS_RENDER_RATE, config.get('volume', 1.0))
+    factor = speed_factor(config.get('speed', TTS_RENDER_RATE))
+    stretch = "" if factor == 1 else f"@{factor:g}"  # exports are made at the Speed setting
+    macros = {name: str(value) for name, value in config.get('macros', {}).items()
+              if name in MACRO_NAMES}
+
+    cache = TTSCache()
+    texts = {}  # cache key -> text
+    exports = []  # (output path, cache key of the full message)
+    recordings = []  # (output path, archive, slot) of recording slots
+    for name in names:
+        bank = MessageBank(name).load()
+        if name == DEFAULT_BANK and 'messages' in config and not bank.path.exists():
+            bank.update_from_config(config['messages'], config.get('processing'))
+        if out_dir is not None:
+            bank.archive.migrate()
+        for key in bank.keys():
+            if out_dir is not None and bank.modes.get(key) == "rec" and key in bank.archive:
+                path = Path(out_dir) / _bank_file_name(name) / f"{key}.{fmt}"
+                recordings.append((path, bank.archive, key))
+            text = bank.texts.get(key, "").strip()
+            if not text or bank.modes.get(key, "tts") != "tts":
+                continue
+            parts = [text]
+            if has_macros(text):
+                parts = static_fragments(text) + [v for v in macros.values() if _speakable(v)]
+            for part in parts:
+                texts[TTSCache.make_key(part, *settings)] = part
+            if out_dir is not None:
+                full = expand_macros(text, macros)
+                full_key = TTSCache.make_key(full, *settings)
+                texts[full_key] = full
+                exports.append((Path(out_dir) / _bank_file_name(name) / f"{key}.{fmt}", full_key))
+
+    todo = {key: text for key, text in texts.items() if force or key not in cache}
+    workers = max(1, min(jobs or os.cpu_count() or 1, len(todo)))
+    failed = 0
+    audio_seconds = 0.0
+    start = time.perf_counter()
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker) as pool:
+            futures = {pool.submit(_render_in_worker, text, str(cache._path(key)), *settings): key
+                       for key, text in todo.items()}
+            for future in as_completed(futures):
+                try:
+                    audio_seconds += future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"Error rendering {todo[futures[future]]!r}: {e}")
+        cache._trim_disk()
+    elapsed = time.perf_counter() - start
+
+    exported = 0
+    if out_dir is not None:
+        manifest_path = Path(out_dir) / ".render_manifest.json"  # file -> cache key it was made from
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            manifest = {}
+        for path, key in exports:
+            name = path.relative_to(out_dir).as_posix()
+            if not force and manifest.get(name) == key + stretch and path.exists():
+                continue
+            entry = cache.get(key)
+            if entry is None:
+                continue
+            data = time_stretch(entry[0], entry[1], factor)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            sf.write(str(path), data, entry[1], subtype="PCM_16")
+            manifest[name] = key + stretch
+            exported += 1
+        for path, archive, key in recordings:
+            name = path.relative_to(out_dir).as_posix()
+            info = archive.entry(key)
+            made_from = f"rec:{info['version']}:{info['frames']}{stretch}"
+            if not force and manifest.get(name) == made_from and path.exists():
+                continue
+            data, samplerate = archive.get(key)
+            if factor != 1:
+                data = time_stretch(data, samplerate, factor)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            sf.write(str(path), data, samplerate, subtype="PCM_16")
+            manifest[name] = made_from
+            exported += 1
+        manifest_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    print(f"Rendered {len(todo) - failed} of {len(texts)} texts "
+          f"({len(texts) - len(todo)} already current, {failed} failed) "
+          f"in {elapsed:.1f}s with {workers} worker(s)")
+    if todo and elapsed > 0:
+        print(f"Throughput: {(len(todo) - failed) / elapsed:.1f} texts/s, "
+              f"{audio_seconds / elapsed:.1f}x real time")
+    if out_dir is not None:
+        print(f"Exported {exported} of {len(exports) + len(recordings)} slot file(s) to {out_dir}")
+    return failed
+
+
+def _report_startup(root):
+    """Print the time until the window was first drawn, then exit (--measure-startup)."""
+    root.update()
+    print(f"Window drawn in {(time.perf_counter() - _START_TIME) * 1000:.0f} ms")
+    root.destroy()
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Voice keyer for amateur radio")
+    parser.add_argument("--measure-startup", action="store_true",
+                        help="print the time until the window is drawn, then exit")
+    parser.add_argument("--daemon", action="store_true",
+                        help="run without a window, controlled over a local socket")
+    parser.add_argument("--port", type=int, default=DAEMON_ADDRESS[1],
+                        help=f"UDP port on 127.0.0.1 for --daemon/--send (default {DAEMON_ADDRESS[1]})")
+    parser.add_argument("--socket", metavar="PATH",
+                        help="use a Unix datagram socket instead of UDP")
+    parser.add_argument("--fake-audio", action="store_true",
+                        help="with --daemon, discard audio instead of opening the sound card")
+    parser.add_argument("--send", metavar="COMMAND",
+                        help="send a command to a running daemon and print the reply")
+    parser.add_argument("--latency", action="store_true",
+                        help="collect key-to-audio and other latency statistics")
+    parser.add_argument("--ptt-test", action="store_true",
+                        help="check PTT lead/tail timing against a pseudo-terminal, then exit")
+    commands = parser.add_subparsers(dest="command")
+    render_parser = commands.add_parser("render", help="pre-render the TTS messages of all banks")
+    render_parser.add_argument("--bank", action="append", metavar="NAME",
+                               help="render only this bank (may be repeated)")
+    render_parser.add_argument("--out", metavar="DIR",
+                               help="also write each slot to DIR/<bank>/<slot>.<format>")
+    render_parser.add_argument("--format", choices=("wav", "flac"), default="wav",
+                               help="file format for --out (default wav)")
+    render_parser.add_argument("--jobs", type=int, metavar="N",
+                               help="worker processes (default: one per CPU core)")
+    render_parser.add_argument("--force", action="store_true",
+                               help="render and export even if the output is current")
+    args = parser.parse_args()
+    address = args.socket or (DAEMON_ADDRESS[0], args.port)
+    if args.latency:
+        LATENCY.enabled = True
+
+    if args.send:
+        try:
+            reply = send_command(args.send, address)
+        except OSError as e:
+            print(f"Error sending command: {e}")
+            sys.exit(1)
+        print(reply)
+        sys.exit(1 if reply.startswith("ERR") else 0)
+
+    if args.command == "render":
+        if not load_audio_libraries(need_device=False):
+            print("Rendering needs numpy and soundfile")
+            sys.exit(1)
+        failed = render_library(args.bank, args.out, args.format, args.jobs, args.force)
+        sys.exit(1 if failed else 0)
+
+    if args.ptt_test:
+        if not hasattr(os, "openpty") or not load_audio_libraries(need_device=False):
+            print("The PTT test needs numpy, soundfile and pseudo-terminals (Linux/macOS)")
+            sys.exit(1)
+        sys.exit(0 if ptt_timing_test() else 1)
+
+    if args.daemon:
+        daemon = KeyerDaemon(address, fake_audio=args.fake_audio)
+        daemon.start()
+        print(f"Voice keyer daemon listening on {address}")
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
     root = tk.Tk()
     app = VoiceKeyerTTS(root)
+    if args.measure_startup:
+        root.after_idle(_report_startup, root)
     root.mainloop()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # frozen exe: render workers must not run main()
     main()